@@ -29,7 +29,7 @@ from importance import (
     remove_keyword,
 )
 from status_handler import get_status_message
-from news_fetcher import fetch_all_news
+from news_fetcher import fetch_all_news_async
 from news_ranker import rank_news
 from translation import translate_title
 from category import classify_category
@@ -175,7 +175,8 @@ async def send_test_news(query):
     
     try:
         await query.message.reply_text("🔄 در حال جمع‌آوری اخبار از منابع...")
-        all_news = fetch_all_news()
+        # دریافت آزمایشی نباید validatorهای GET شرطی scheduler را جلو ببرد
+        all_news = await fetch_all_news_async(update_state=False)
         
         if not all_news:
             await query.message.reply_text("❌ هیچ خبری یافت نشد.")
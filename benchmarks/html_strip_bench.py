@@ -0,0 +1,135 @@
+"""
+میکروبنچمارک پاک‌سازی HTML خلاصه‌های RSS
+
+مسیر فعلی news_fetcher.strip_html (lxml با fallback) را با مسیر قدیمی
+BeautifulSoup(summary, "html.parser").get_text() مقایسه می‌کند و throughput
+(خلاصه در ثانیه) و تطابق خروجی را به‌صورت JSON چاپ می‌کند.
+
+نمونه‌ها به‌طور پیش‌فرض از چند خلاصه واقعی (شکل فیدهای منابع پیش‌فرض) ساخته
+می‌شوند؛ با --feed می‌توان فایل‌های XML فید ذخیره‌شده را داد.
+
+اجرا:
+    python benchmarks/html_strip_bench.py
+    python benchmarks/html_strip_bench.py --feed variety.xml deadline.xml --repeat 20
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# خلاصه‌ها به همان شکلی که فیدهای سینمایی معمولاً می‌فرستند
+SAMPLES = [
+    '<img width="700" height="394" src="https://variety.com/wp-content/uploads/2025/01/poster.jpg" '
+    'class="attachment-large size-large wp-post-image" alt="" /><p>The studio has set a summer '
+    'release date for the sequel, with the original director returning and principal photography '
+    'scheduled to begin in London this spring.</p><p>The post <a href="https://variety.com/2025/film/'
+    'news/sequel-date-1236">Sequel Gets Summer Release Date</a> appeared first on <a href='
+    '"https://variety.com">Variety</a>.</p>',
+    '<p>EXCLUSIVE: The Oscar&#8217;s winner is in talks to star in the thriller &#8230; '
+    '<a href="https://deadline.com/2025/01/thriller-casting-123/">Read More</a></p>',
+    '<div class="feed-description"><p><strong>Box office:</strong> the film opened to '
+    '$45&nbsp;million domestically, ahead of tracking.</p><ul><li>Opening: $45M</li>'
+    '<li>Global: $110M</li></ul></div>',
+    'Plain text summary without any markup, as some scrape-backed feeds send it.',
+    '<p>Review: a meticulous, haunting drama <em>&ldquo;that lingers&rdquo;</em> long after '
+    'the credits. <br/><br/>Rating: 4/5</p>',
+    '<table><tr><td><a href="https://www.imdb.com/title/tt0000001/">'
+    '<img src="https://m.media-amazon.com/images/M/x.jpg"/></a></td><td>New trailer released '
+    'for the upcoming adaptation, starring an ensemble cast.</td></tr></table>',
+]
+
+
+def load_feed_samples(paths):
+    import feedparser
+
+    samples = []
+    for path in paths:
+        feed = feedparser.parse(path)
+        for entry in feed.entries:
+            summary = entry.get("summary", "") or entry.get("description", "")
+            if summary:
+                samples.append(summary)
+    return samples
+
+
+def bench(fn, samples, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for sample in samples:
+            fn(sample)
+    elapsed = time.perf_counter() - started
+    count = repeat * len(samples)
+    return {
+        "summaries": count,
+        "total_ms": round(elapsed * 1000, 2),
+        "per_summary_us": round(elapsed / count * 1e6, 2),
+        "summaries_per_sec": round(count / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML summary stripping micro-benchmark")
+    parser.add_argument("--feed", nargs="+", help="saved feed XML files to take summaries from")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    feeds = [os.path.abspath(path) for path in args.feed or []]
+    output = os.path.abspath(args.output) if args.output else None
+
+    # import news_fetcher یک پوشه data می‌سازد؛ در پوشه موقت اجرا می‌کنیم
+    workdir = tempfile.mkdtemp(prefix="html_strip_bench_")
+    os.chdir(workdir)
+    try:
+        run(feeds, output, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(feeds, output, repeat):
+    from bs4 import BeautifulSoup
+    import news_fetcher
+
+    samples = load_feed_samples(feeds) if feeds else SAMPLES
+
+    def baseline(text):
+        return BeautifulSoup(text, "html.parser").get_text().strip()[:400]
+
+    mismatches = sum(1 for s in samples if news_fetcher.strip_html(s) != baseline(s))
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": datetime.utcnow().isoformat(),
+            "lxml": news_fetcher.lxml_html is not None,
+            "samples": len(samples),
+            "repeat": repeat,
+        },
+        "beautifulsoup": bench(baseline, samples, repeat),
+        "strip_html": bench(news_fetcher.strip_html, samples, repeat),
+        "output_mismatches": mismatches,
+    }
+    results["speedup"] = round(
+        results["beautifulsoup"]["total_ms"] / results["strip_html"]["total_ms"], 2
+    )
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+بنچمارک آفلاین pipeline خبر از روی آرشیو ضبط‌شده
+
+fetch_all_news (با FETCH_ARCHIVE_MODE=replay، بدون شبکه)، rank_news و
+find_daily_trends را روی یک چرخه ضبط‌شده اجرا و زمان هر مرحله را به‌صورت JSON
+چاپ می‌کند. هر تکرار روی یک پوشه data موقت تازه اجرا می‌شود تا وضعیت‌هایی مثل
+sent و وضعیت منابع روی تکرار بعدی اثر نگذارند.
+
+ضبط یک چرخه (یک بار، با شبکه):
+    FETCH_ARCHIVE_MODE=record FETCH_ARCHIVE_DIR=archive python news_fetcher.py
+
+اجرا:
+    python benchmarks/pipeline_bench.py --archive archive
+    python benchmarks/pipeline_bench.py --archive archive --cycle 20250101T120000000000 --output run.json
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = (
+    "database", "sqlite_backend", "link_identity", "fetch_archive",
+    "news_fetcher", "news_ranker", "trends",
+)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def run_once(archive, cycle, manifest):
+    """یک اجرای کامل pipeline روی پوشه موقت تازه؛ (زمان‌ها به ms, شمارش‌ها)"""
+    workdir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    cwd = os.getcwd()
+    database = None
+    try:
+        os.chdir(workdir)
+        os.environ["FETCH_ARCHIVE_MODE"] = "replay"
+        os.environ["FETCH_ARCHIVE_DIR"] = archive
+        os.environ["FETCH_ARCHIVE_CYCLE"] = cycle
+        os.environ["DB_PATH"] = os.path.join(workdir, "data", "bot.db")
+        for name in MODULES:
+            sys.modules.pop(name, None)
+
+        database = importlib.import_module("database")
+        for url in manifest["rss"]:
+            database.add_rss_source(url)
+        for url in manifest["scrape"]:
+            database.add_scrape_source(url)
+        # محدودیت نرخ و بودجه برای شبکه واقعی است، نه پخش از آرشیو
+        database.set_setting("host_rate_per_second", 1_000_000)
+        database.set_setting("host_burst", 1_000_000)
+        database.set_setting("fetch_cycle_budget_seconds", 3600)
+
+        news_fetcher = importlib.import_module("news_fetcher")
+        news_ranker = importlib.import_module("news_ranker")
+        trends = importlib.import_module("trends")
+        logging.disable(logging.INFO)
+
+        timings = {}
+
+        started = time.perf_counter()
+        articles = news_fetcher.fetch_all_news()
+        timings["fetch_all_news"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        ranked = news_ranker.rank_news(articles, min_importance=0)
+        timings["rank_news"] = (time.perf_counter() - started) * 1000
+
+        for item in ranked:
+            trends.save_daily_news(item)
+
+        started = time.perf_counter()
+        found = trends.find_daily_trends(min_sources=2)
+        timings["find_daily_trends"] = (time.perf_counter() - started) * 1000
+
+        counts = {"articles": len(articles), "ranked": len(ranked), "trends": len(found)}
+        return timings, counts
+    finally:
+        # مسیرهای database نسبی (data/) هستند؛ هر نوشتن معوقی باید قبل از برگشتن به
+        # cwd اصلی انجام شود وگرنه writer روی data/ واقعی ربات می‌نویسد
+        if database is not None:
+            database.flush_storage()
+            compaction = getattr(database, "_sent_compaction_thread", None)
+            if compaction is not None:
+                compaction.join()
+        logging.disable(logging.NOTSET)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline fetch/rank/trends benchmark from a recorded archive")
+    parser.add_argument("--archive", required=True, help="FETCH_ARCHIVE_DIR of a recorded run")
+    parser.add_argument("--cycle", help="recorded cycle id (default: latest)")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    archive = os.path.abspath(args.archive)
+    os.environ["FETCH_ARCHIVE_DIR"] = archive
+    fetch_archive = importlib.import_module("fetch_archive")
+    cycles = fetch_archive.list_cycles()
+    if not cycles:
+        sys.exit(f"no recorded cycles in {archive}")
+    cycle = args.cycle or cycles[-1]
+    manifest = fetch_archive.read_manifest(cycle)
+
+    per_stage = {}
+    counts = None
+    for i in range(args.iterations):
+        print(f"⏱️ iteration {i + 1}/{args.iterations} ...", file=sys.stderr)
+        timings, run_counts = run_once(archive, cycle, manifest)
+        for stage, ms in timings.items():
+            per_stage.setdefault(stage, []).append(ms)
+        if counts is not None and run_counts != counts:
+            print(f"⚠️ non-deterministic output: {run_counts} != {counts}", file=sys.stderr)
+        counts = run_counts
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": datetime.utcnow().isoformat(),
+            "archive": archive,
+            "cycle": cycle,
+            "recorded_at": manifest.get("recorded_at"),
+            "sources": len(manifest["rss"]) + len(manifest["scrape"]),
+        },
+        "counts": counts,
+        "stages": {stage: summarize(ms) for stage, ms in per_stage.items()},
+    }
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
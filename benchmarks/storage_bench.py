@@ -0,0 +1,221 @@
+"""
+بنچمارک ذخیره‌سازی database.py در حجم‌های واقعی
+
+کاملاً آفلاین و روی یک پوشه data موقت اجرا می‌شود. برای هر حجم لینک ارسال‌شده
+(پیش‌فرض 10k، 100k و 1M) داده مصنوعی ساخته می‌شود و latency و حافظه اوج توابع
+اصلی اندازه‌گیری و به‌صورت JSON چاپ می‌شود تا اجراها قابل مقایسه باشند.
+
+اجرا:
+    python benchmarks/storage_bench.py
+    python benchmarks/storage_bench.py --sizes 10000 100000 --output before.json
+    DB_BACKEND=sqlite python benchmarks/storage_bench.py
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from link_identity import link_key
+
+SOURCES = [f"https://source{i}.example.com/feed/" for i in range(12)]
+
+
+def seed(base, sent_links, topic_days, topics_per_day, news_days, news_per_day):
+    """ساخت داده مصنوعی با همان فرمت فایل‌های database.py"""
+    os.makedirs(f"{base}/topics", exist_ok=True)
+    os.makedirs(f"{base}/collected_news", exist_ok=True)
+
+    now = time.time()
+    with open(f"{base}/sent.log", "w", encoding="utf-8") as f:
+        for i in range(sent_links):
+            ts = now - (sent_links - i) * 60
+            # همان فرمت پایدار sent.log (کلید link_key)
+            f.write(f"{ts:.0f}\t{link_key(f'https://news.example.com/2025/story-{i}/')}\n")
+
+    today = datetime.utcnow().date()
+    for d in range(topic_days):
+        date = (today - timedelta(days=d)).isoformat()
+        with open(f"{base}/topics/{date}.jsonl", "w", encoding="utf-8") as f:
+            for i in range(topics_per_day):
+                f.write(json.dumps({
+                    "topic": f"Topic {i % (topics_per_day // 3 or 1)} on {date}",
+                    "link": f"https://news.example.com/{date}/{i}",
+                    "source": SOURCES[i % len(SOURCES)],
+                    "date": date,
+                    "timestamp": datetime.utcnow().isoformat(),
+                }) + "\n")
+
+    for d in range(news_days):
+        date = (today - timedelta(days=d)).isoformat()
+        news = [
+            {
+                "title": f"Synthetic headline number {i} for {date}",
+                "link": f"https://news.example.com/{date}/article-{i}",
+                "summary": "Lorem ipsum dolor sit amet " * 10,
+                "source": SOURCES[i % len(SOURCES)],
+                "published": datetime.utcnow().isoformat(),
+                "importance": i % 4,
+            }
+            for i in range(news_per_day)
+        ]
+        with open(f"{base}/collected_news/{date}.json", "w", encoding="utf-8") as f:
+            json.dump(news, f, ensure_ascii=False, indent=2)
+
+
+def measure(fn, iterations):
+    """زمان هر فراخوانی (ms) و حافظه اوج (KiB) در یک اجرای جدا با tracemalloc"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        "max_ms": round(timings[-1], 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_size(sent_links, args):
+    """یک اجرای کامل روی پوشه موقت تازه"""
+    workdir = tempfile.mkdtemp(prefix="storage_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        os.environ["DB_PATH"] = os.path.join(workdir, "data", "bot.db")
+        seed("data", sent_links, args.topic_days, args.topics_per_day,
+             args.news_days, args.news_per_day)
+
+        for name in ("database", "sqlite_backend"):
+            sys.modules.pop(name, None)
+        database = importlib.import_module("database")
+        if database.DB_BACKEND == "sqlite":
+            importlib.import_module("sqlite_backend").migrate_from_json("data")
+
+        today = datetime.utcnow().date().isoformat()
+        n = args.iterations
+        ops = {}
+
+        # اولین فراخوانی شامل بارگذاری ایندکس sent است
+        started = time.perf_counter()
+        database.is_sent("https://news.example.com/2025/story-0/")
+        load_ms = (time.perf_counter() - started) * 1000
+        peak = 0
+        if getattr(database, "_sent_index", None) is not None:
+            database._sent_index = None
+            tracemalloc.start()
+            database.is_sent("https://news.example.com/2025/story-0/")
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        ops["sent_load"] = {
+            "iterations": 1,
+            "p50_ms": round(load_ms, 4),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+        ops["is_sent_hit"] = measure(
+            lambda i: database.is_sent(f"https://news.example.com/2025/story-{(i * 7919) % sent_links}/"), n)
+        ops["is_sent_miss"] = measure(
+            lambda i: database.is_sent(f"https://missing.example.com/{i}"), n)
+        # بالای SENT_MAX_ENTRIES * 1.1 خود mark_sent فشرده‌سازی را در thread پس‌زمینه
+        # شروع می‌کند که با اندازه‌گیری‌های بعدی هم‌زمان می‌شد؛ سقف موقتاً برداشته و
+        # فشرده‌سازی جدا به‌عنوان sent_compaction اندازه‌گیری می‌شود
+        max_entries = getattr(database, "SENT_MAX_ENTRIES", None)
+        if max_entries is not None:
+            database.SENT_MAX_ENTRIES = sys.maxsize
+        ops["mark_sent"] = measure(
+            lambda i: database.mark_sent(f"https://new.example.com/{i}"), n)
+        if max_entries is not None:
+            database.SENT_MAX_ENTRIES = max_entries
+        started = time.perf_counter()
+        database.cleanup_old_sent()
+        ops["sent_compaction"] = {
+            "iterations": 1,
+            "p50_ms": round((time.perf_counter() - started) * 1000, 4),
+        }
+        ops["save_topic"] = measure(
+            lambda i: database.save_topic(f"Bench topic {i}", f"https://t.example.com/{i}",
+                                          SOURCES[i % len(SOURCES)], today), n)
+        ops["daily_trends"] = measure(lambda i: database.daily_trends(today), max(n // 10, 3))
+        # نوشتن JSON با debounce انجام می‌شود؛ flush داخل اندازه‌گیری تا I/O دیسک هم حساب شود
+        flush = getattr(database, "flush_storage", lambda: None)
+
+        def save_collected_news(i):
+            database.save_collected_news([{
+                "title": f"Bench news {i}", "link": f"https://c.example.com/{i}",
+                "summary": "", "source": SOURCES[0], "importance": 1,
+            }])
+            flush()
+
+        ops["save_collected_news"] = measure(save_collected_news, n)
+        ops["get_all_collected_news"] = measure(
+            lambda i: sum(1 for _ in database.get_all_collected_news(args.news_days)),
+            max(n // 10, 3))
+
+        if hasattr(database, "flush_storage"):
+            database.flush_storage()
+
+        return {"sent_links": sent_links, "ops": ops}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage benchmark for database.py")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="number of sent links to seed")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--topic-days", type=int, default=30)
+    parser.add_argument("--topics-per-day", type=int, default=300)
+    parser.add_argument("--news-days", type=int, default=7)
+    parser.add_argument("--news-per-day", type=int, default=300)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "backend": os.getenv("DB_BACKEND", "json"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": datetime.utcnow().isoformat(),
+            "params": vars(args),
+        },
+        "runs": [],
+    }
+
+    for size in args.sizes:
+        print(f"⏱️ sent_links={size} ...", file=sys.stderr)
+        results["runs"].append(run_size(size, args))
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
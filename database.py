@@ -3,51 +3,224 @@
 همه توابع مورد نیاز تعریف شده‌اند
 """
 
+import atexit
 import json
 import os
+import re
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from link_identity import as_link_key, is_link_key, link_key
+
 BASE = "data"
 os.makedirs(BASE, exist_ok=True)
 
+# بک‌اند ذخیره‌سازی: json (پیش‌فرض) یا sqlite
+DB_BACKEND = os.getenv("DB_BACKEND", "json").lower()
+
 FILES = {
     "settings": f"{BASE}/settings.json",
     "sources": f"{BASE}/sources.json",
     "sent": f"{BASE}/sent.json",
+    "sent_log": f"{BASE}/sent.log",
     "topics": f"{BASE}/topics.json",
     "collected_news": f"{BASE}/collected_news.json"
 }
 
-def _load(name, default):
-    """بارگذاری امن فایل JSON"""
+TOPICS_DIR = f"{BASE}/topics"
+COLLECTED_NEWS_DIR = f"{BASE}/collected_news"
+os.makedirs(TOPICS_DIR, exist_ok=True)
+os.makedirs(COLLECTED_NEWS_DIR, exist_ok=True)
+
+# ============ CACHE ============
+# کش داخل حافظه: path -> ((mtime_ns, size), data)
+# فایل فقط وقتی دوباره خوانده می‌شود که mtime یا size آن تغییر کرده باشد
+_CACHE = {}
+_CACHE_STATS = {"hits": 0, "misses": 0, "writes": 0, "mutations": 0}
+_cache_lock = threading.RLock()
+
+
+def _file_signature(path):
+    """امضای فایل برای تشخیص تغییر (یا None اگر وجود ندارد)"""
     try:
-        if not os.path.exists(FILES[name]):
-            with open(FILES[name], "w", encoding="utf-8") as f:
-                json.dump(default, f, ensure_ascii=False, indent=2)
-            return default
-        
-        with open(FILES[name], encoding="utf-8") as f:
-            content = f.read().strip()
-            
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_path(path, default):
+    """بارگذاری امن فایل JSON از مسیر با استفاده از کش"""
+    with _cache_lock:
+        cached = _CACHE.get(path)
+        if cached is not None and (path in _dirty or path in _flushing):
+            # تغییرات هنوز روی دیسک نرفته؛ نسخه حافظه معتبر است
+            _CACHE_STATS["hits"] += 1
+            return cached[1]
+
+        signature = _file_signature(path)
+        if signature is not None and cached is not None and cached[0] == signature:
+            _CACHE_STATS["hits"] += 1
+            return cached[1]
+
+        _CACHE_STATS["misses"] += 1
+        try:
+            if signature is None:
+                _save_path(path, default)
+                return default
+
+            with open(path, encoding="utf-8") as f:
+                content = f.read().strip()
+
             if not content:
-                with open(FILES[name], "w", encoding="utf-8") as f:
-                    json.dump(default, f, ensure_ascii=False, indent=2)
+                _save_path(path, default)
                 return default
-            
+
             data = json.loads(content)
+            _CACHE[path] = (signature, data)
             return data
-    except Exception as e:
-        print(f"⚠️ خطا در بارگذاری {name}: {e}")
-        return default
+        except Exception as e:
+            print(f"⚠️ خطا در بارگذاری {path}: {e}")
+            return default
+
+
+def _save_path(path, data):
+    """ذخیره امن فایل JSON در مسیر و بروزرسانی کش (write-through)"""
+    with _cache_lock:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            _CACHE[path] = (_file_signature(path), data)
+            _CACHE_STATS["writes"] += 1
+        except Exception as e:
+            _CACHE.pop(path, None)
+            print(f"❌ خطا در ذخیره {path}: {e}")
+
+
+def _load(name, default):
+    """بارگذاری امن فایل JSON"""
+    return _load_path(FILES[name], default)
+
 
 def _save(name, data):
     """ذخیره امن فایل JSON"""
-    try:
-        with open(FILES[name], "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"❌ خطا در ذخیره {name}: {e}")
+    _save_path(FILES[name], data)
+
+
+def get_cache_stats():
+    """آمار کش: تعداد hit، miss، نوشتن و فایل‌های کش‌شده"""
+    with _cache_lock:
+        stats = dict(_CACHE_STATS)
+        stats["entries"] = len(_CACHE)
+    return stats
+
+
+def clear_cache():
+    """خالی کردن کش (مثلاً بعد از تغییر دستی فایل‌ها)"""
+    flush_storage()
+    with _cache_lock:
+        _CACHE.clear()
+
+
+# ============ WRITER ============
+# همه تغییرات سندهای JSON از _mutate می‌گذرند: تغییر بلافاصله و به‌ترتیب زیر قفل
+# روی نسخه حافظه اعمال می‌شود (خواندن بعدی آن را می‌بیند) و فقط یک thread نویسنده
+# سندهای تغییرکرده را بعد از یک وقفه کوتاه (debounce) روی دیسک می‌نویسد.
+# چند تغییر پشت‌سرهم روی یک فایل در یک نوشتن فیزیکی جمع می‌شوند.
+FLUSH_DELAY = float(os.getenv("STORAGE_FLUSH_DELAY", "0.5"))
+FLUSH_MAX_DELAY = FLUSH_DELAY * 10
+
+_dirty = set()
+_flushing = set()
+_last_mutation = 0.0
+_writer_wakeup = threading.Condition(_cache_lock)
+_flush_lock = threading.Lock()
+_writer_thread = None
+
+
+def _mutate(path, default, apply):
+    """اعمال تغییر روی سند و زمان‌بندی نوشتن آن توسط writer"""
+    global _last_mutation, _writer_thread
+    with _cache_lock:
+        data = _load_path(path, default)
+        if not isinstance(data, type(default)):
+            data = default
+        result = apply(data)
+        cached = _CACHE.get(path)
+        _CACHE[path] = (cached[0] if cached else None, data)
+        _dirty.add(path)
+        _CACHE_STATS["mutations"] += 1
+        _last_mutation = time.monotonic()
+
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(
+                target=_writer_loop, name="storage-writer", daemon=True
+            )
+            _writer_thread.start()
+        _writer_wakeup.notify()
+    return result
+
+
+def _writer_loop():
+    """thread نویسنده: صبر تا آرام شدن تغییرات، سپس یک نوشتن برای هر فایل"""
+    while True:
+        try:
+            with _cache_lock:
+                while not _dirty:
+                    _writer_wakeup.wait()
+            started = time.monotonic()
+
+            while True:
+                with _cache_lock:
+                    idle = time.monotonic() - _last_mutation
+                if idle >= FLUSH_DELAY or time.monotonic() - started >= FLUSH_MAX_DELAY:
+                    break
+                time.sleep(FLUSH_DELAY - idle)
+
+            flush_storage()
+        except Exception as e:
+            # thread نویسنده نباید بمیرد؛ وگرنه همه تغییرات بعدی فقط در حافظه می‌مانند
+            print(f"❌ خطا در thread نویسنده: {e}")
+            time.sleep(FLUSH_DELAY)
+
+
+def flush_storage():
+    """نوشتن فوری همه تغییرات در انتظار روی دیسک"""
+    with _flush_lock:
+        with _cache_lock:
+            batch = {}
+            for path in _dirty:
+                try:
+                    batch[path] = json.dumps(_CACHE[path][1], ensure_ascii=False, indent=2)
+                except Exception as e:
+                    # مقدار غیرقابل ذخیره: تغییرات در انتظار این فایل کنار گذاشته می‌شوند
+                    # و خواندن بعدی آخرین نسخه سالم روی دیسک را می‌بیند
+                    print(f"❌ خطا در ذخیره {path}: {e}")
+                    _CACHE.pop(path, None)
+            _flushing.update(batch)
+            _dirty.clear()
+
+        for path, text in batch.items():
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+                with _cache_lock:
+                    _CACHE[path] = (_file_signature(path), _CACHE[path][1])
+                    _CACHE_STATS["writes"] += 1
+            except Exception as e:
+                print(f"❌ خطا در ذخیره {path}: {e}")
+                with _cache_lock:
+                    _dirty.add(path)
+            finally:
+                with _cache_lock:
+                    _flushing.discard(path)
+
+
+atexit.register(flush_storage)
 
 # ============ SETTINGS ============
 def get_setting(key, default=None):
@@ -57,9 +230,10 @@ def get_setting(key, default=None):
 
 def set_setting(key, value):
     """ذخیره یک تنظیم"""
-    s = _load("settings", {})
-    s[key] = value
-    _save("settings", s)
+    def apply(s):
+        s[key] = value
+
+    _mutate(FILES["settings"], {}, apply)
 
 # ============ SOURCES ============
 def get_sources():
@@ -69,109 +243,437 @@ def get_sources():
 def get_rss_sources():
     """دریافت منابع RSS"""
     data = get_sources()
-    return data.get("rss", [])
+    return list(data.get("rss", []))
 
 def get_scrape_sources():
     """دریافت منابع Scrape"""
     data = get_sources()
-    return data.get("scrape", [])
+    return list(data.get("scrape", []))
+
+def _add_source(kind, url):
+    def apply(data):
+        urls = data.setdefault(kind, [])
+        if url not in urls:
+            urls.append(url)
+
+    _mutate(FILES["sources"], {"rss": [], "scrape": []}, apply)
+
+def _remove_source(kind, url):
+    def apply(data):
+        if url in data.get(kind, []):
+            data[kind].remove(url)
+
+    _mutate(FILES["sources"], {"rss": [], "scrape": []}, apply)
 
 def add_rss_source(url):
     """افزودن منبع RSS"""
-    data = get_sources()
-    if "rss" not in data:
-        data["rss"] = []
-    if url not in data["rss"]:
-        data["rss"].append(url)
-        _save("sources", data)
+    _add_source("rss", url)
 
 def add_scrape_source(url):
     """افزودن منبع Scrape"""
-    data = get_sources()
-    if "scrape" not in data:
-        data["scrape"] = []
-    if url not in data["scrape"]:
-        data["scrape"].append(url)
-        _save("sources", data)
+    _add_source("scrape", url)
 
 def remove_rss_source(url):
     """حذف منبع RSS"""
-    data = get_sources()
-    if "rss" in data and url in data["rss"]:
-        data["rss"].remove(url)
-        _save("sources", data)
+    _remove_source("rss", url)
 
 def remove_scrape_source(url):
     """حذف منبع Scrape"""
-    data = get_sources()
-    if "scrape" in data and url in data["scrape"]:
-        data["scrape"].remove(url)
-        _save("sources", data)
+    _remove_source("scrape", url)
+
+# قواعد استخراج هر دامنه کنار منابع در sources.json (کلید "rules": {domain: rule})
+def get_scrape_rules():
+    """دریافت قواعد استخراج Scraping به شکل {domain: rule}"""
+    return dict(get_sources().get("rules", {}))
+
+def set_scrape_rule(domain, rule):
+    """افزودن/جایگزینی قاعده استخراج یک دامنه"""
+    def apply(data):
+        data.setdefault("rules", {})[domain] = rule
+
+    _mutate(FILES["sources"], {"rss": [], "scrape": []}, apply)
+
+def remove_scrape_rule(domain):
+    """حذف قاعده استخراج یک دامنه"""
+    def apply(data):
+        data.get("rules", {}).pop(domain, None)
+
+    _mutate(FILES["sources"], {"rss": [], "scrape": []}, apply)
+
+# ============ FETCH STATE ============
+# سندهای کوچک وضعیت دریافت منابع (مثلاً http_cache) هر کدام در data/<name>.json
+# به شکل {key: {...}}؛ key معمولاً URL منبع است
+def get_fetch_state(name):
+    """خواندن سند وضعیت (فقط خواندنی؛ تغییر فقط با update_fetch_state)"""
+    return _load_path(f"{BASE}/{name}.json", {})
+
+def update_fetch_state(name, key, apply):
+    """اعمال apply روی ورودی key از سند name و برگرداندن خروجی آن"""
+    def apply_doc(doc):
+        return apply(doc.setdefault(key, {}))
+
+    return _mutate(f"{BASE}/{name}.json", {}, apply_doc)
+
+def remove_fetch_state(name, keys):
+    """حذف ورودی‌های keys از سند name"""
+    keys = list(keys)
+    if not keys:
+        return
+
+    def apply_doc(doc):
+        for key in keys:
+            doc.pop(key, None)
+
+    _mutate(f"{BASE}/{name}.json", {}, apply_doc)
 
 # ============ SENT ============
+# لینک‌های ارسال‌شده در یک dict مرتب (کلید -> زمان ارسال) در حافظه نگه داشته می‌شوند
+# و هر لینک جدید فقط یک خط "timestamp<TAB>key" به انتهای sent.log اضافه می‌کند.
+# key همان link_key (hash ثابت URL canonical) است؛ خطوط قدیمی با URL خام هنگام
+# بارگذاری hash و فایل یک بار بازنویسی می‌شود.
+# sent.json قدیمی فقط یک بار برای ساخت sent.log خوانده می‌شود.
+SENT_TTL_DAYS = 30
+# سقف اطمینان برای حافظه؛ حذف عادی بر اساس TTL انجام می‌شود. عبور از سقف (با 10%
+# فضای اضافه) یک فشرده‌سازی پس‌زمینه راه می‌اندازد که قدیمی‌ترین‌ها را از حافظه و
+# sent.log با هم حذف می‌کند
+SENT_MAX_ENTRIES = 100000
+
+_sent_index = None
+_sent_lock = threading.RLock()
+# خطوطی که در حین فشرده‌سازی اضافه می‌شوند (None یعنی فشرده‌سازی در جریان نیست)
+_sent_pending = None
+_sent_compaction_thread = None
+
+
+def _sent_line(uid, ts):
+    return f"{ts:.0f}\t{uid}\n"
+
+
+def _write_sent_log(entries):
+    """بازنویسی اتمیک sent.log"""
+    tmp_path = FILES["sent_log"] + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for uid, ts in entries:
+            f.write(_sent_line(uid, ts))
+    os.replace(tmp_path, FILES["sent_log"])
+
+
+def _sent_store():
+    """بارگذاری یک‌باره لینک‌های ارسال‌شده در حافظه"""
+    global _sent_index
+    if _sent_index is not None:
+        return _sent_index
+
+    index = {}
+    now = time.time()
+    try:
+        if os.path.exists(FILES["sent_log"]):
+            legacy_lines = False
+            with open(FILES["sent_log"], encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    ts, sep, uid = line.partition("\t")
+                    if not sep:
+                        # خط قدیمی بدون زمان
+                        ts, uid = now, line
+                    if not uid:
+                        continue
+                    if not is_link_key(uid):
+                        uid = link_key(uid)
+                        legacy_lines = True
+                    try:
+                        index[uid] = float(ts)
+                    except ValueError:
+                        index[uid] = now
+            if legacy_lines:
+                _write_sent_log(index.items())
+        else:
+            legacy = _load("sent", [])
+            if isinstance(legacy, list):
+                for uid in legacy:
+                    if isinstance(uid, str):
+                        index[as_link_key(uid)] = now
+            _write_sent_log(index.items())
+    except Exception as e:
+        print(f"⚠️ خطا در بارگذاری sent: {e}")
+
+    _sent_index = index
+    return _sent_index
+
+
 def is_sent(uid):
-    """چک کردن ارسال شده بودن"""
-    sent_list = _load("sent", [])
-    if not isinstance(sent_list, list):
-        sent_list = []
-    return uid in sent_list
+    """چک کردن ارسال شده بودن (بر اساس link_key)"""
+    key = as_link_key(uid)
+    with _sent_lock:
+        return key in _sent_store()
+
+
+def is_sent_many(uids):
+    """چک کردن دسته‌ای؛ مجموعه uidهایی که قبلاً ارسال شده‌اند"""
+    keyed = [(uid, as_link_key(uid)) for uid in uids]
+    with _sent_lock:
+        index = _sent_store()
+        return {uid for uid, key in keyed if key in index}
+
 
 def mark_sent(uid):
     """علامت‌گذاری به عنوان ارسال شده"""
-    sent_list = _load("sent", [])
-    if not isinstance(sent_list, list):
-        sent_list = []
-    if uid not in sent_list:
-        sent_list.append(uid)
-        _save("sent", sent_list)
-
-def cleanup_old_sent(days=30):
-    """پاکسازی لیست sent (فعلاً فقط محدودیت تعداد)"""
-    sent_list = _load("sent", [])
-    if not isinstance(sent_list, list):
-        return
-    
-    # نگه‌داشتن فقط 10000 آیتم آخر
-    if len(sent_list) > 10000:
-        sent_list = sent_list[-10000:]
-        _save("sent", sent_list)
+    mark_sent_many([uid])
+
+
+def mark_sent_many(uids):
+    """علامت‌گذاری دسته‌ای با یک بار نوشتن در sent.log"""
+    now = time.time()
+    with _sent_lock:
+        index = _sent_store()
+        lines = []
+        for uid in uids:
+            key = as_link_key(uid)
+            if key not in index:
+                index[key] = now
+                lines.append(_sent_line(key, now))
+
+        if not lines:
+            return
+        try:
+            with open(FILES["sent_log"], "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except Exception as e:
+            print(f"❌ خطا در ذخیره sent: {e}")
+
+        if _sent_pending is not None:
+            _sent_pending.extend(lines)
+
+        if len(index) > SENT_MAX_ENTRIES * 1.1:
+            _start_sent_compaction()
+
+
+def _start_sent_compaction():
+    """اجرای cleanup_old_sent در پس‌زمینه (اگر همین حالا در جریان نباشد)"""
+    global _sent_compaction_thread
+    with _sent_lock:
+        if _sent_compaction_thread is not None and _sent_compaction_thread.is_alive():
+            return
+        _sent_compaction_thread = threading.Thread(
+            target=cleanup_old_sent, name="sent-compaction", daemon=True
+        )
+        _sent_compaction_thread.start()
+
+
+def cleanup_old_sent(days=None):
+    """
+    حذف لینک‌های قدیمی‌تر از days روز (TTL) و فشرده‌سازی sent.log؛
+    اگر بعد از آن هم بیشتر از SENT_MAX_ENTRIES مانده باشد قدیمی‌ترین‌ها حذف می‌شوند
+
+    فقط ساخت snapshot زیر قفل انجام می‌شود و نوشتن فایل بیرون از قفل است،
+    پس is_sent/mark_sent در حین اجرا بلاک نمی‌شوند.
+    خروجی: {"evicted", "remaining", "duration"}
+    """
+    global _sent_pending
+    started = time.perf_counter()
+    if days is None:
+        days = float(get_setting("sent_ttl_days", SENT_TTL_DAYS))
+    cutoff = time.time() - days * 86400
+
+    with _sent_lock:
+        if _sent_pending is not None:
+            return {"evicted": 0, "remaining": len(_sent_store()), "duration": 0.0}
+
+        index = _sent_store()
+        expired = [uid for uid, ts in index.items() if ts < cutoff]
+        for uid in expired:
+            del index[uid]
+        if len(index) > SENT_MAX_ENTRIES:
+            oldest = sorted(index, key=index.get)[:len(index) - SENT_MAX_ENTRIES]
+            for uid in oldest:
+                del index[uid]
+            expired.extend(oldest)
+        survivors = list(index.items())
+        evicted = len(expired)
+        _sent_pending = []
+
+    tmp_path = FILES["sent_log"] + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for uid, ts in survivors:
+                f.write(_sent_line(uid, ts))
+
+        with _sent_lock:
+            # خطوطی که در حین نوشتن اضافه شدند
+            with open(tmp_path, "a", encoding="utf-8") as f:
+                f.writelines(_sent_pending)
+            os.replace(tmp_path, FILES["sent_log"])
+            remaining = len(index)
+    except Exception as e:
+        print(f"❌ خطا در فشرده‌سازی sent: {e}")
+        remaining = len(index)
+    finally:
+        with _sent_lock:
+            _sent_pending = None
+
+    return {
+        "evicted": evicted,
+        "remaining": remaining,
+        "duration": round(time.perf_counter() - started, 4),
+    }
 
 # ============ TOPICS ============
+# topicها به‌صورت JSON-lines و یک فایل برای هر روز ذخیره می‌شوند:
+# data/topics/YYYY-MM-DD.jsonl
+TOPIC_RETENTION_DAYS = 30
+
+_topics_lock = threading.RLock()
+_topics_migrated = False
+
+
+def _topic_partition(date):
+    """مسیر فایل روزانه topic"""
+    if not isinstance(date, str) or not re.fullmatch(r"\d{4}-\d{2}-\d{2}", date):
+        date = datetime.utcnow().date().isoformat()
+    return os.path.join(TOPICS_DIR, f"{date}.jsonl")
+
+
+def _append_topics(records):
+    """افزودن رکوردها به انتهای فایل روزانه مربوط"""
+    by_partition = {}
+    for record in records:
+        by_partition.setdefault(_topic_partition(record.get("date")), []).append(record)
+
+    for path, items in by_partition.items():
+        with open(path, "a", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def _read_topic_partition(path):
+    """خواندن یک فایل روزانه (خطوط خراب نادیده گرفته می‌شوند)"""
+    items = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(item, dict):
+                    items.append(item)
+    except FileNotFoundError:
+        pass
+    return items
+
+
+def _migrate_legacy_topics():
+    """انتقال یک‌باره topics.json قدیمی به فایل‌های روزانه"""
+    global _topics_migrated
+    if _topics_migrated:
+        return
+    _topics_migrated = True
+
+    if not os.path.exists(FILES["topics"]):
+        return
+    try:
+        with open(FILES["topics"], encoding="utf-8") as f:
+            content = f.read().strip()
+        legacy = json.loads(content) if content else []
+        if isinstance(legacy, list):
+            _append_topics(item for item in legacy if isinstance(item, dict))
+            os.replace(FILES["topics"], FILES["topics"] + ".migrated")
+    except Exception as e:
+        print(f"⚠️ خطا در انتقال topics: {e}")
+
+
 def save_topic(topic, link, source, date):
     """ذخیره topic برای تحلیل ترند"""
-    data = _load("topics", [])
-    
-    # اطمینان از اینکه لیست است
-    if not isinstance(data, list):
-        data = []
-    
-    data.append({
-        "topic": topic,
-        "link": link,
-        "source": source,
-        "date": date,
-        "timestamp": datetime.now().isoformat()
-    })
-    
-    _save("topics", data)
+    save_topics_many([{"topic": topic, "link": link, "source": source, "date": date}])
+
+
+def save_topics_many(topics):
+    """ذخیره دسته‌ای topicها (هر دیکشنری: topic, link, source, date)"""
+    timestamp = datetime.now().isoformat()
+    records = [
+        {
+            "topic": item.get("topic"),
+            "link": item.get("link"),
+            "source": item.get("source"),
+            "date": item.get("date"),
+            "timestamp": timestamp
+        }
+        for item in topics
+    ]
+    if not records:
+        return
+
+    with _topics_lock:
+        _migrate_legacy_topics()
+        try:
+            _append_topics(records)
+        except Exception as e:
+            print(f"❌ خطا در ذخیره topic: {e}")
+
+
+def compact_topics(retention_days=None):
+    """
+    فشرده‌سازی فایل‌های topic:
+    حذف روزهای قدیمی‌تر از retention و حذف خطوط تکراری/خراب
+    """
+    if retention_days is None:
+        retention_days = int(get_setting("topic_retention_days", TOPIC_RETENTION_DAYS))
+    cutoff = (datetime.utcnow().date() - timedelta(days=retention_days)).isoformat()
+
+    removed_files = 0
+    removed_lines = 0
+
+    with _topics_lock:
+        _migrate_legacy_topics()
+        names = sorted(os.listdir(TOPICS_DIR))
+
+    for name in names:
+        if not name.endswith(".jsonl"):
+            continue
+        path = os.path.join(TOPICS_DIR, name)
+
+        with _topics_lock:
+            try:
+                if name[:-len(".jsonl")] < cutoff:
+                    os.remove(path)
+                    removed_files += 1
+                    continue
+
+                with open(path, encoding="utf-8") as f:
+                    total = sum(1 for _ in f)
+
+                unique = {}
+                for item in _read_topic_partition(path):
+                    key = (item.get("topic"), item.get("link"), item.get("source"))
+                    unique.setdefault(key, item)
+
+                if len(unique) == total:
+                    continue
+
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for item in unique.values():
+                        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, path)
+                removed_lines += total - len(unique)
+            except Exception as e:
+                print(f"⚠️ خطا در فشرده‌سازی {name}: {e}")
+
+    return {"removed_files": removed_files, "removed_lines": removed_lines}
+
 
 def daily_trends(date=None):
     """دریافت ترندهای یک روز خاص"""
     if date is None:
         date = datetime.utcnow().date().isoformat()
-    
-    data = _load("topics", [])
-    
-    # اطمینان از اینکه لیست است
-    if not isinstance(data, list):
-        return []
-    
+
+    with _topics_lock:
+        _migrate_legacy_topics()
+        data = _read_topic_partition(_topic_partition(date))
+
     count = {}
     
     for item in data:
-        if not isinstance(item, dict):
-            continue
-        
         if item.get("date") == date:
             topic = item.get("topic", "")
             source = item.get("source", "unknown")
@@ -202,68 +704,179 @@ def daily_trends(date=None):
     return trends
 
 # ============ COLLECTED NEWS ============
+# هر روز یک فایل جدا: data/collected_news/YYYY-MM-DD.json
+COLLECTED_NEWS_DAYS = 7
+
+_collected_lock = threading.RLock()
+_collected_migrated = False
+# ایندکس‌های ثانویه هر روز:
+# date -> (لیست اخبار، {"link": {link: pos}, "source": {source: [pos]}, "importance": {level: [pos]}}، طول لیست)
+_collected_index = {}
+
+
+def _collected_shard(date):
+    """مسیر فایل اخبار یک روز"""
+    return os.path.join(COLLECTED_NEWS_DIR, f"{date}.json")
+
+
+def _collected_dates():
+    """تاریخ‌های موجود، جدیدترین اول"""
+    dates = [
+        name[:-len(".json")]
+        for name in os.listdir(COLLECTED_NEWS_DIR)
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}\.json", name)
+    ]
+    return sorted(dates, reverse=True)
+
+
+def _index_news(index, pos, news):
+    index["link"].setdefault(news.get("link"), pos)
+    index["source"].setdefault(news.get("source"), []).append(pos)
+    index["importance"].setdefault(news.get("importance"), []).append(pos)
+
+
+def _collected_day_index(date, news_list):
+    """ایندکس یک روز؛ اگر سند از دیسک دوباره خوانده شده باشد از نو ساخته می‌شود"""
+    entry = _collected_index.get(date)
+    if entry is not None and entry[0] is news_list and entry[2] == len(news_list):
+        return entry[1]
+
+    index = {"link": {}, "source": {}, "importance": {}}
+    for pos, news in enumerate(news_list):
+        _index_news(index, pos, news)
+    _collected_index[date] = (news_list, index, len(news_list))
+    return index
+
+
+def _migrate_legacy_collected_news():
+    """انتقال یک‌باره collected_news.json قدیمی به فایل‌های روزانه"""
+    global _collected_migrated
+    if _collected_migrated:
+        return
+    _collected_migrated = True
+
+    if not os.path.exists(FILES["collected_news"]):
+        return
+    try:
+        with open(FILES["collected_news"], encoding="utf-8") as f:
+            content = f.read().strip()
+        legacy = json.loads(content) if content else {}
+        if isinstance(legacy, dict):
+            for date, news in legacy.items():
+                if isinstance(news, list) and re.fullmatch(r"\d{4}-\d{2}-\d{2}", date):
+                    _save_path(_collected_shard(date), news)
+            os.replace(FILES["collected_news"], FILES["collected_news"] + ".migrated")
+    except Exception as e:
+        print(f"⚠️ خطا در انتقال collected_news: {e}")
+
+
 def save_collected_news(news_list):
-    """ذخیره اخبار جمع‌آوری شده روزانه"""
+    """ذخیره اخبار جمع‌آوری شده روزانه (فقط فایل امروز نوشته می‌شود)"""
     today = datetime.utcnow().date().isoformat()
-    
-    all_news = _load("collected_news", {})
-    
-    # اطمینان از اینکه dict است
-    if not isinstance(all_news, dict):
-        all_news = {}
-    
-    if today not in all_news:
-        all_news[today] = []
-    
-    # دریافت لینک‌های موجود
-    existing_links = {news.get("link") for news in all_news[today]}
-    
-    # اضافه کردن اخبار جدید
-    for news in news_list:
-        link = news.get("link")
-        if link and link not in existing_links:
-            all_news[today].append(news)
-            existing_links.add(link)
-    
-    # حذف اخبار قدیمی‌تر از 7 روز
-    cutoff_date = (datetime.utcnow().date() - timedelta(days=7)).isoformat()
-    all_news = {d: n for d, n in all_news.items() if d >= cutoff_date}
-    
-    _save("collected_news", all_news)
+
+    with _collected_lock:
+        _migrate_legacy_collected_news()
+
+        def apply(today_news):
+            index = _collected_day_index(today, today_news)
+
+            # اضافه کردن اخبار جدید (چک تکراری با ایندکس لینک)
+            for news in news_list:
+                link = news.get("link")
+                if link and link not in index["link"]:
+                    _index_news(index, len(today_news), news)
+                    today_news.append(news)
+            _collected_index[today] = (today_news, index, len(today_news))
+
+        _mutate(_collected_shard(today), [], apply)
+
+        # حذف فایل‌های قدیمی‌تر از 7 روز
+        cutoff_date = (datetime.utcnow().date() - timedelta(days=COLLECTED_NEWS_DAYS)).isoformat()
+        for date in _collected_dates():
+            if date < cutoff_date:
+                _collected_index.pop(date, None)
+                try:
+                    os.remove(_collected_shard(date))
+                except OSError as e:
+                    print(f"⚠️ خطا در حذف {date}: {e}")
+
 
 def get_collected_news(limit=None, date=None):
     """خواندن اخبار جمع‌آوری شده"""
-    all_news = _load("collected_news", {})
-    
-    if not isinstance(all_news, dict):
-        return []
-    
     if date is None:
         date = datetime.utcnow().date().isoformat()
-    
-    news = all_news.get(date, [])
-    
+
+    with _collected_lock:
+        _migrate_legacy_collected_news()
+        path = _collected_shard(date)
+        if not os.path.exists(path):
+            return []
+        news = _load_path(path, [])
+
     if not isinstance(news, list):
         return []
-    
+
     if limit:
         return news[:limit]
     return news
 
+
 def get_all_collected_news(days=7):
-    """دریافت تمام اخبار چند روز اخیر"""
-    all_news = _load("collected_news", {})
-    
-    if not isinstance(all_news, dict):
-        return []
-    
-    result = []
-    for date in sorted(all_news.keys(), reverse=True)[:days]:
-        news = all_news[date]
-        if isinstance(news, list):
-            result.extend(news)
-    
-    return result
+    """دریافت تمام اخبار چند روز اخیر؛ فایل‌ها به‌ترتیب جدیدترین اول و به‌صورت lazy خوانده می‌شوند"""
+    with _collected_lock:
+        _migrate_legacy_collected_news()
+        dates = _collected_dates()[:days]
+
+    for date in dates:
+        yield from get_collected_news(date=date)
+
+
+def query_collected_news(date=None, link=None, source=None, importance=None,
+                         days=COLLECTED_NEWS_DAYS):
+    """
+    جستجوی اخبار جمع‌آوری شده با ایندکس‌ها (بدون پیمایش خطی)
+    مثال: query_collected_news(date=today, importance=3)
+    اگر date داده نشود، days روز اخیر (جدیدترین اول) جستجو می‌شود.
+    """
+    with _collected_lock:
+        _migrate_legacy_collected_news()
+        dates = [date] if date else _collected_dates()[:days]
+
+    results = []
+    for day in dates:
+        with _collected_lock:
+            if not os.path.exists(_collected_shard(day)):
+                continue
+            news_list = get_collected_news(date=day)
+            index = _collected_day_index(day, news_list)
+
+            positions = None
+            if link is not None:
+                pos = index["link"].get(link)
+                positions = [] if pos is None else [pos]
+            for field, value in (("source", source), ("importance", importance)):
+                if value is None:
+                    continue
+                matches = index[field].get(value, [])
+                if positions is None:
+                    positions = matches
+                else:
+                    wanted = set(matches)
+                    positions = [pos for pos in positions if pos in wanted]
+            if positions is None:
+                positions = range(len(news_list))
+
+            results.extend(news_list[pos] for pos in positions)
+
+    return results
+
+
+# ============ BACKEND ============
+if DB_BACKEND == "sqlite":
+    import sqlite_backend as _backend
+
+    for _name in _backend.API:
+        globals()[_name] = getattr(_backend, _name)
 
 
 # ============ تست ============
@@ -16,3 +16,28 @@ DEFAULT_SCRAPE_SITES = [
     "https://www.screendaily.com/news",
     "https://www.empireonline.com/movies/news/"
 ]
+
+# قواعد استخراج اختصاصی هر دامنه (بدون www.)؛ دامنه بدون قاعده از روش عمومی استفاده می‌کند
+#   item:         بلوک‌های تیتر (XPath؛ یا CSS با پیشوند "css:" اگر cssselect نصب باشد)
+#   link:         لینک داخل هر بلوک (پیش‌فرض .//a[@href])
+#   link_pattern: regex که href باید با آن match شود
+#   title / date: متن تیتر و تاریخ نسبت به بلوک (اختیاری؛ date می‌تواند attribute باشد)
+DEFAULT_SCRAPE_RULES = {
+    "hollywoodreporter.com": {
+        "item": "//*[self::h2 or self::h3][contains(@class, 'title')]",
+        "link_pattern": r"hollywoodreporter\.com/(movies|tv|news|business|lifestyle)/",
+    },
+    "screendaily.com": {
+        "item": "//*[self::h2 or self::h3][a]",
+        "link_pattern": r"/news/[^/]+/\d+\.article",
+    },
+    "imdb.com": {
+        "link_pattern": r"/news/ni\d+",
+    },
+    "empireonline.com": {
+        "item": "//article",
+        "link_pattern": r"/movies/news/[^/]+/?$",
+        "title": ".//h3",
+        "date": ".//time/@datetime",
+    },
+}
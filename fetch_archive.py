@@ -0,0 +1,193 @@
+"""
+آرشیو ضبط و پخش پاسخ‌های HTTP برای اجرای آفلاین
+
+حالت با متغیر محیطی FETCH_ARCHIVE_MODE تعیین می‌شود:
+    off     (پیش‌فرض) درخواست‌ها مستقیم به شبکه می‌روند
+    record  هر پاسخ (هدرها + body خام، gzip) در آرشیو نوشته می‌شود
+    replay  پاسخ‌ها فقط از آرشیو خوانده می‌شوند؛ هیچ درخواست شبکه‌ای نیست
+
+ساختار آرشیو (FETCH_ARCHIVE_DIR، پیش‌فرض data/fetch_archive):
+    <cycle>/manifest.json       منابع و زمان ضبط آن چرخه
+    <cycle>/<hash(url)>.json.gz یک پاسخ برای هر URL
+
+در record هر چرخه fetch یک شناسه جدید (زمان شروع) می‌گیرد. در replay چرخه
+FETCH_ARCHIVE_CYCLE (یا آخرین چرخه ضبط‌شده) پخش می‌شود و clock() زمان ضبط
+همان چرخه را برمی‌گرداند تا فیلتر سن اخبار مثل زمان ضبط رفتار کند.
+
+وقتی آرشیو فعال است GET شرطی فرستاده نمی‌شود تا همیشه body کامل ضبط شود.
+در record کل body خام هر پاسخ پیش از رسیدن به news_fetcher در حافظه خوانده
+می‌شود؛ پس سقف حجم پاسخ و توقف زودهنگام اسکن لینک‌ها فقط روی parse اثر دارند،
+نه روی دانلود و حافظه. حالت record برای ساختن fixture است، نه اجرای عادی.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MODE = os.getenv("FETCH_ARCHIVE_MODE", "off").lower()
+ARCHIVE_DIR = os.getenv("FETCH_ARCHIVE_DIR", "data/fetch_archive")
+
+_state = {"cycle": None, "recorded_at": None}
+_lock = threading.Lock()
+
+
+def enabled():
+    return MODE in ("record", "replay")
+
+
+def _url_key(url):
+    return hashlib.sha1(str(url).encode("utf-8")).hexdigest()[:20]
+
+
+def _entry_path(cycle, url):
+    return os.path.join(ARCHIVE_DIR, cycle, f"{_url_key(url)}.json.gz")
+
+
+def list_cycles():
+    """شناسه چرخه‌های ضبط‌شده به ترتیب زمان"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(ARCHIVE_DIR)
+        if os.path.exists(os.path.join(ARCHIVE_DIR, name, "manifest.json"))
+    )
+
+
+def read_manifest(cycle):
+    with open(os.path.join(ARCHIVE_DIR, cycle, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def start_cycle(rss_sources, scrape_sources):
+    """شروع یک چرخه fetch؛ در record چرخه جدید، در replay چرخه انتخاب‌شده"""
+    if MODE == "record":
+        cycle = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        os.makedirs(os.path.join(ARCHIVE_DIR, cycle), exist_ok=True)
+        manifest = {
+            "cycle": cycle,
+            "recorded_at": datetime.now().isoformat(),
+            "rss": list(rss_sources),
+            "scrape": list(scrape_sources),
+        }
+        with open(os.path.join(ARCHIVE_DIR, cycle, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        logger.info(f"📼 ضبط چرخه fetch در {ARCHIVE_DIR}/{cycle}")
+    elif MODE == "replay":
+        cycles = list_cycles()
+        cycle = os.getenv("FETCH_ARCHIVE_CYCLE") or (cycles[-1] if cycles else None)
+        if cycle is None:
+            raise RuntimeError(f"آرشیو خالی است: {ARCHIVE_DIR}")
+        manifest = read_manifest(cycle)
+        logger.info(f"📼 پخش چرخه {cycle} از {ARCHIVE_DIR}")
+    else:
+        return None
+
+    with _lock:
+        _state["cycle"] = cycle
+        _state["recorded_at"] = datetime.fromisoformat(manifest["recorded_at"])
+    return cycle
+
+
+def clock():
+    """زمان «حال» برای منطق وابسته به زمان؛ در replay زمان ضبط چرخه"""
+    if MODE == "replay" and _state["recorded_at"] is not None:
+        return _state["recorded_at"]
+    return datetime.now()
+
+
+def _current_cycle():
+    cycle = _state["cycle"]
+    if cycle is None:
+        # درخواست بیرون از fetch_all_news (مثلاً fetch_rss_feed)
+        start_cycle([], [])
+        cycle = _state["cycle"]
+    return cycle
+
+
+def _write(request, response, body, elapsed):
+    path = _entry_path(_current_cycle(), request.url)
+    record = {
+        "url": str(request.url),
+        "method": request.method,
+        "status": response.status_code,
+        # body خام (با همان Content-Encoding)؛ httpx موقع پخش دوباره decode می‌کند
+        "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in response.headers.raw],
+        "body": base64.b64encode(body).decode("ascii"),
+        "elapsed": round(elapsed, 4),
+    }
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(record, f)
+
+
+def _read(request):
+    path = _entry_path(_current_cycle(), request.url)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        raise httpx.ConnectError(f"در آرشیو نیست: {request.url}", request=request)
+    return httpx.Response(
+        record["status"],
+        headers=record["headers"],
+        content=base64.b64decode(record["body"]),
+        request=request,
+    )
+
+
+class ArchiveTransport(httpx.BaseTransport):
+    """transport همگام: ضبط پاسخ‌های transport داخلی یا پخش از آرشیو"""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+
+    def handle_request(self, request):
+        # body کامل خوانده می‌شود (سقف حجم news_fetcher اینجا اعمال نمی‌شود)
+        if MODE == "replay":
+            return _read(request)
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            body = b"".join(response.iter_raw())
+        finally:
+            response.close()
+        _write(request, response, body, time.perf_counter() - started)
+        return httpx.Response(response.status_code, headers=response.headers.raw,
+                              content=body, request=request, extensions=response.extensions)
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+class AsyncArchiveTransport(httpx.AsyncBaseTransport):
+    """نسخه async همان transport"""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        if MODE == "replay":
+            return _read(request)
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        _write(request, response, body, time.perf_counter() - started)
+        return httpx.Response(response.status_code, headers=response.headers.raw,
+                              content=body, request=request, extensions=response.extensions)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
@@ -3,8 +3,11 @@ Initial setup script
 This file adds default sources to the database
 """
 
-from database import add_rss_source, add_scrape_source, get_rss_sources, get_scrape_sources
-from default_sources import DEFAULT_RSS_SOURCES, DEFAULT_SCRAPE_SITES
+from database import (
+    add_rss_source, add_scrape_source, get_rss_sources, get_scrape_sources,
+    get_scrape_rules, set_scrape_rule,
+)
+from default_sources import DEFAULT_RSS_SOURCES, DEFAULT_SCRAPE_SITES, DEFAULT_SCRAPE_RULES
 
 def initialize_sources():
     """Add default sources to database"""
@@ -36,10 +39,20 @@ def initialize_sources():
             added_scrape += 1
             print(f"Added Scrape: {url}")
     
+    # Add scrape rules
+    added_rules = 0
+    current_rules = get_scrape_rules()
+    for domain, rule in DEFAULT_SCRAPE_RULES.items():
+        if domain not in current_rules:
+            set_scrape_rule(domain, rule)
+            added_rules += 1
+            print(f"Added scrape rule: {domain}")
+    
     print("\n" + "="*60)
     print(f"Setup complete!")
     print(f"   {added_rss} new RSS sources added")
     print(f"   {added_scrape} new Scrape sources added")
+    print(f"   {added_rules} new scrape rules added")
     print("="*60 + "\n")
 
 
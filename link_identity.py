@@ -0,0 +1,84 @@
+"""
+هویت لینک‌ها برای جلوگیری از تکرار
+
+یک خبر با URLهای مختلف می‌آید: لینک RSS با پارامترهای utm_*، لینک scrape بدون
+آن‌ها، http/https، www، اسلش انتهایی یا نسخه AMP. canonicalize_url یک URL تمیز
+و قابل باز کردن می‌سازد و link_key یک کلید ثابت 32 کاراکتری (hash) که در
+ذخیره و چک لینک‌های ارسال‌شده استفاده می‌شود.
+"""
+
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+LINK_KEY_LENGTH = 32  # blake2b با digest 16 بایتی به hex
+
+# پارامترهای رهگیری که محتوای صفحه را تغییر نمی‌دهند
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "ref", "ref_src", "ref_url", "referrer", "cmpid", "ncid", "ito",
+    "smid", "taid", "mbid", "soc_src", "soc_trk", "sr_share", "spm",
+    "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "hsa_")
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+_AMP_SUFFIX = re.compile(r"/amp/?$", re.IGNORECASE)
+_AMP_EXTENSION = re.compile(r"\.amp(\.html?)?$", re.IGNORECASE)
+_LINK_KEY = re.compile(r"^[0-9a-f]{%d}$" % LINK_KEY_LENGTH)
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url):
+    """URL تمیز: بدون پارامتر رهگیری، fragment، پورت پیش‌فرض و نسخه AMP؛ host با حروف کوچک"""
+    url = (url or "").strip()
+    if url.startswith("//"):
+        url = "https:" + url
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("amp."):
+        host = host[len("amp."):]
+    netloc = host if port is None or str(port) == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+
+    path = _AMP_EXTENSION.sub(r"\1", _AMP_SUFFIX.sub("", parts.path)) or "/"
+    query = urlencode(sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(name)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def link_key(url):
+    """کلید ثابت لینک؛ scheme، www و اسلش انتهایی در آن نقشی ندارند"""
+    parts = urlsplit(canonicalize_url(url))
+    host = parts.netloc.removeprefix("www.")
+    identity = host + (parts.path.rstrip("/") or "/")
+    if parts.query:
+        identity += "?" + parts.query
+    if not host:
+        identity = url  # uid غیر URL (مثلاً تست‌ها) همان‌طور hash می‌شود
+    return hashlib.blake2b(identity.encode("utf-8"), digest_size=LINK_KEY_LENGTH // 2).hexdigest()
+
+
+def is_link_key(value):
+    """آیا مقدار همین حالا یک کلید link_key است؟ (برای تبدیل داده‌های قدیمی)"""
+    return bool(_LINK_KEY.match(value))
+
+
+def as_link_key(value):
+    return value if is_link_key(value) else link_key(value)
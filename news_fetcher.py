@@ -3,208 +3,1119 @@
 
 تغییرات مهم در این نسخه:
 - mark_sent() حذف شد - فقط بعد از ارسال موفق در news_scheduler صدا زده می‌شود
-- فقط is_sent() برای چک کردن استفاده می‌شود
+- فقط is_sent_many() برای چک کردن استفاده می‌شود (یک بار برای هر منبع)
+- fetch_all_news_async() همه منابع را همزمان (با httpx) دریافت می‌کند؛
+  مدت یک چرخه تقریباً برابر کندترین منبع است، نه مجموع همه
+- GET شرطی: ETag/Last-Modified هر منبع ذخیره می‌شود و پاسخ 304 بدون parse رد می‌شود
+- سلامت هر منبع ثبت می‌شود؛ منبعی که پشت سر هم خطا می‌دهد با circuit breaker
+  (backoff نمایی) موقتاً کنار گذاشته و بعداً half-open امتحان می‌شود
+- پاک‌سازی HTML خلاصه‌ها با lxml (در صورت خطا BeautifulSoup)
+- صفحات Scraping فقط تا اولین لینک‌های لازم و بدون ساختن درخت کامل parse می‌شوند
+- لینک‌ها canonical می‌شوند (بدون utm_*، fragment، AMP و ...) تا یک خبر با URLهای
+  مختلف تکراری حساب شود؛ sent store با link_key همین URL کار می‌کند
+- قواعد استخراج اختصاصی هر دامنه (XPath/CSS، الگوی لینک، تیتر، تاریخ) یک بار
+  compile و cache می‌شوند؛ روش عمومی کلیدواژه‌ای fallback است
+- RSS افزایشی: پردازش هر فید روی اولین ورودی که لینکش قبلاً ارسال شده متوقف می‌شود
+- ضبط/پخش پاسخ‌ها (FETCH_ARCHIVE_MODE=record|replay) برای اجرای آفلاین و بنچمارک
+- بودجه زمانی هر چرخه (fetch_cycle_budget_seconds): با تمام شدن آن دریافت‌های
+  در جریان لغو و اخبار رسیده تحویل داده می‌شوند؛ منابع جامانده ثبت می‌شوند
+- محدودکننده مؤدبانه برای هر host (token bucket + سقف درخواست همزمان)؛
+  hostهای مختلف کاملاً موازی پیش می‌روند
+- خطاهای گذرا (شبکه، timeout، 429/5xx) با backoff نمایی و jitter دوباره امتحان
+  می‌شوند؛ اگر منبعی تا p95 زمان پاسخ خودش جواب نداد یک درخواست دوم (hedge)
+  فرستاده می‌شود و اولین جواب برنده است (hedge_requests)
+- body پاسخ‌ها جریانی و با سقف حجم هر منبع (source_max_bytes / <kind>_max_bytes)
+  خوانده می‌شود؛ صفحات Scraping حین دریافت اسکن و با پیدا شدن لینک‌ها قطع می‌شوند
+  و صفحات بزرگ‌تر از سقف گزارش می‌شوند
+- یک client مشترک با connection pool و keep-alive (و HTTP/2 در صورت نصب h2)
+  برای هر دو مسیر RSS و Scraping؛ bytes پاسخ مستقیم به feedparser/BeautifulSoup می‌رسد
 """
 
+import asyncio
+import codecs
 import feedparser
-import requests
-from bs4 import BeautifulSoup
+import fetch_archive
+import json
+import random
+import re
+import httpx
+import threading
+import time
+from bs4 import BeautifulSoup, SoupStrainer
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlparse
 import logging
 
-from database import get_rss_sources, get_scrape_sources, is_sent
+try:
+    from lxml import etree as lxml_etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml اختیاری است؛ بدون آن BeautifulSoup
+    lxml_etree = lxml_html = None
+
+from link_identity import canonicalize_url
+from database import (
+    get_rss_sources, get_scrape_sources, get_setting, set_setting, is_sent_many,
+    get_fetch_state, update_fetch_state, get_scrape_rules,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
 
-def fetch_rss_feed(url):
-    """دریافت اخبار از یک فید RSS"""
+# پیش‌فرض‌ها (قابل تغییر از تنظیمات)
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUTS = {"rss": 20, "scrape": 15}
+DEFAULT_CYCLE_BUDGET = 120          # ثانیه برای کل یک چرخه دریافت
+DEFAULT_MAX_BYTES = {"rss": 5 * 1024 * 1024, "scrape": 3 * 1024 * 1024}  # سقف body هر پاسخ
+DEFAULT_HOST_RATE = 1.0        # درخواست در ثانیه برای هر host
+DEFAULT_HOST_BURST = 2
+DEFAULT_HOST_MAX_IN_FLIGHT = 2
+SCRAPE_LINK_LIMIT = 30              # فقط 30 لینک اول هر صفحه
+LINK_SCAN_CHUNK = 16 * 1024
+DEFAULT_BREAKER_THRESHOLD = 3       # خطای پشت سر هم تا باز شدن مدار
+DEFAULT_BREAKER_BACKOFF_MINUTES = 30
+DEFAULT_BREAKER_MAX_BACKOFF_HOURS = 24
+DEFAULT_MAX_RETRIES = 2            # تلاش دوباره برای خطاهای گذرا
+DEFAULT_RETRY_BACKOFF = 1.0         # ثانیه؛ پایه backoff نمایی (با jitter کامل)
+DEFAULT_RETRY_MAX_BACKOFF = 10.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+LATENCY_WINDOW = 20                 # چند latency آخر هر منبع برای p95
+HEDGE_MIN_SAMPLES = 5               # بدون این تعداد نمونه hedge نمی‌شود
+HEDGE_MIN_DELAY = 0.5               # ثانیه؛ hedge زودتر از این فرستاده نمی‌شود
+DEFAULT_POOL_LIMITS = httpx.Limits(
+    max_connections=20, max_keepalive_connections=10, keepalive_expiry=60
+)
+
+
+# ============ HTTP CLIENT ============
+# client بلندمدت و مشترک؛ اتصال‌های TLS به یک host (مثلاً دو فید variety.com)
+# دوباره استفاده می‌شوند. AsyncClient به event loop وابسته است، پس برای هر loop
+# (scheduler و admin bot) یک نمونه جدا نگه می‌داریم.
+_sync_client = None
+_async_clients = {}
+_client_lock = threading.Lock()
+
+
+def _http2_enabled():
+    """HTTP/2 فقط اگر تنظیم روشن باشد و پکیج h2 نصب باشد"""
+    if str(get_setting("http2_enabled", "1")) in ("0", "false", "False"):
+        return False
     try:
-        logger.info(f"📰 در حال خواندن RSS: {url[:50]}...")
-        feed = feedparser.parse(url)
-        articles = []
-        
-        for entry in feed.entries[:15]:  # فقط 15 خبر آخر
-            link = entry.get("link", "")
-            
-            # 🔧 FIX: فقط چک کردن، بدون mark کردن
-            if not link or is_sent(link):
-                continue
-            
-            # استخراج تاریخ
-            published = entry.get("published_parsed") or entry.get("updated_parsed")
-            if published:
-                try:
-                    pub_date = datetime(*published[:6])
-                except:
-                    pub_date = datetime.now()
-            else:
-                pub_date = datetime.now()
-            
-            # فقط اخبار 7 روز اخیر
-            if (datetime.now() - pub_date).days > 7:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options(asynchronous=False):
+    options = {
+        "headers": HEADERS,
+        "follow_redirects": True,
+        "limits": DEFAULT_POOL_LIMITS,
+        "http2": _http2_enabled(),
+    }
+    if fetch_archive.enabled():
+        # transport اختصاصی؛ pool و HTTP/2 روی transport داخلی تنظیم می‌شوند
+        pool = {"limits": options.pop("limits"), "http2": options.pop("http2")}
+        if asynchronous:
+            options["transport"] = fetch_archive.AsyncArchiveTransport(httpx.AsyncHTTPTransport(**pool))
+        else:
+            options["transport"] = fetch_archive.ArchiveTransport(httpx.HTTPTransport(**pool))
+    return options
+
+
+def get_http_client():
+    """client همگام مشترک (برای fetch_rss_feed / fetch_scraped_page)"""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(**_client_options())
+        return _sync_client
+
+
+def get_async_client():
+    """AsyncClient مشترک برای event loop جاری"""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        # پاک کردن client های loop های بسته‌شده
+        for old_loop in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[old_loop]
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = _async_clients[loop] = httpx.AsyncClient(**_client_options(asynchronous=True))
+        return client
+
+
+async def close_async_client():
+    """بستن AsyncClient این loop (قبل از بسته شدن خود loop)"""
+    with _client_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def close_http_client():
+    """بستن client همگام"""
+    global _sync_client
+    with _client_lock:
+        client, _sync_client = _sync_client, None
+    if client is not None:
+        client.close()
+
+
+# ============ SOURCE HEALTH ============
+# وضعیت در fetch_state("source_health"):
+#   {url: {"success", "failure", "consecutive_errors", "latency_ms", "last_error",
+#          "state": closed|open|half_open, "open_until": ts}}
+def source_allowed(url, now=None):
+    """آیا منبع امتحان شود؟ مدار باز تا پایان backoff رد می‌شود و بعد half-open"""
+    now = now or time.time()
+    entry = get_fetch_state("source_health").get(url, {})
+    if entry.get("state") != "open":
+        return True
+    if now < entry.get("open_until", 0):
+        return False
+
+    def apply(entry):
+        entry["state"] = "half_open"
+
+    update_fetch_state("source_health", url, apply)
+    logger.info(f"🔌 امتحان half-open منبع: {url[:50]}")
+    return True
+
+
+def record_source_result(url, ok, latency, error=None, now=None):
+    """ثبت نتیجه یک درخواست و باز/بسته کردن مدار منبع"""
+    now = now or time.time()
+    threshold = int(get_setting("breaker_failure_threshold", DEFAULT_BREAKER_THRESHOLD))
+    base = float(get_setting("breaker_backoff_minutes", DEFAULT_BREAKER_BACKOFF_MINUTES)) * 60
+    cap = float(get_setting("breaker_max_backoff_hours", DEFAULT_BREAKER_MAX_BACKOFF_HOURS)) * 3600
+
+    def apply(entry):
+        latency_ms = latency * 1000
+        previous = entry.get("latency_ms")
+        entry["latency_ms"] = latency_ms if previous is None else 0.3 * latency_ms + 0.7 * previous
+        entry["last_attempt"] = now
+        entry.setdefault("state", "closed")
+        if ok:
+            # فقط پاسخ‌های موفق در p95 (برای hedge) حساب می‌شوند
+            entry["latencies"] = (entry.get("latencies", []) + [round(latency_ms, 1)])[-LATENCY_WINDOW:]
+            entry["success"] = entry.get("success", 0) + 1
+            entry["consecutive_errors"] = 0
+            entry["state"] = "closed"
+            entry.pop("open_until", None)
+            return entry
+
+        entry["failure"] = entry.get("failure", 0) + 1
+        entry["consecutive_errors"] = entry.get("consecutive_errors", 0) + 1
+        entry["last_error"] = str(error)[:200]
+        if entry["consecutive_errors"] >= threshold:
+            # هر شکست بیشتر (از جمله probe ناموفق half-open) backoff را دو برابر می‌کند
+            backoff = min(base * 2 ** (entry["consecutive_errors"] - threshold), cap)
+            entry["state"] = "open"
+            entry["open_until"] = now + backoff
+        return entry
+
+    entry = update_fetch_state("source_health", url, apply)
+    if entry.get("state") == "open" and not ok:
+        logger.warning(
+            f"🔌 مدار منبع باز شد ({entry['consecutive_errors']} خطای پیاپی، "
+            f"{(entry['open_until'] - now) / 60:.0f} دقیقه): {url[:50]}"
+        )
+
+
+def strip_html(text, limit=400):
+    """متن ساده از HTML خلاصه؛ مسیر سریع lxml و BeautifulSoup برای markup عجیب"""
+    if "<" not in text and "&" not in text:
+        return text.strip()[:limit]
+
+    if lxml_html is not None:
+        try:
+            fragment = lxml_html.fragment_fromstring(text, create_parent="div")
+            lxml_etree.strip_elements(fragment, "script", "style", with_tail=False)
+            return fragment.text_content().strip()[:limit]
+        except (lxml_etree.LxmlError, ValueError):
+            pass
+
+    return BeautifulSoup(text, "html.parser").get_text().strip()[:limit]
+
+
+def _unseen_entries(entries, sent_links, retry_links=()):
+    """ورودی‌های جدیدتر از اولین لینک ارسال‌شده (فیدها جدیدترین-اول هستند)
+
+    مرز از خود sent store می‌آید، نه از آخرین fetch. خبری که زیر مرز مانده فقط وقتی
+    برمی‌گردد که در retry_links باشد (ارسال ناموفق در چرخه قبل، سند send_retry).
+    """
+    for i, (link, _) in enumerate(entries):
+        if link in sent_links:
+            return entries[:i] + [
+                (older, entry) for older, entry in entries[i + 1:]
+                if older in retry_links and older not in sent_links
+            ]
+    return entries
+
+
+def _rss_articles(url, feed):
+    """استخراج اخبار جدید از فید parse شده"""
+    articles = []
+
+    all_entries = [
+        (canonicalize_url(entry.get("link", "")), entry)
+        for entry in feed.entries[:15]  # فقط 15 خبر آخر
+    ]
+    # 🔧 FIX: فقط چک کردن، بدون mark کردن
+    sent_links = is_sent_many(link for link, _ in all_entries)
+
+    # توقف روی اولین خبر ارسال‌شده؛ فید بدون خبر جدید تقریباً هزینه‌ای ندارد
+    entries = _unseen_entries(all_entries, sent_links, get_fetch_state("send_retry"))
+    if not entries:
+        logger.info(f"✅ RSS: خبر جدیدی نیست {url[:30]}")
+        return articles
+
+    for link, entry in entries:
+        if not link:
+            continue
+
+        # استخراج تاریخ
+        published = entry.get("published_parsed") or entry.get("updated_parsed")
+        if published:
+            try:
+                pub_date = datetime(*published[:6])
+            except:
+                pub_date = fetch_archive.clock()
+        else:
+            pub_date = fetch_archive.clock()
+
+        # فقط اخبار 7 روز اخیر (در replay نسبت به زمان ضبط)
+        if (fetch_archive.clock() - pub_date).days > 7:
+            continue
+
+        title = entry.get("title", "بدون عنوان")
+        summary = entry.get("summary", "") or entry.get("description", "")
+
+        # پاک‌سازی HTML از summary
+        if summary:
+            summary = strip_html(summary)
+
+        articles.append({
+            "title": title,
+            "link": link,
+            "summary": summary,
+            "source": url,
+            "published": pub_date.isoformat(),
+        })
+
+        # 🔧 FIX: حذف mark_sent از اینجا
+        # mark_sent باید فقط بعد از ارسال موفق صدا زده شود
+
+    logger.info(f"✅ RSS: {len(articles)} خبر جدید از {url[:30]} ({len(entries)}/{len(all_entries)} ورودی بررسی شد)")
+    return articles
+
+
+class _LinkCollector:
+    """target پارسر lxml که فقط (href, متن) تگ‌های <a href> را جمع می‌کند
+
+    درختی ساخته نمی‌شود؛ متن مثل get_text(strip=True) تکه‌تکه strip و چسبانده می‌شود.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.links = []
+        self._open = []     # anchorهای باز: [href, تکه‌های متن] یا None (بدون href)
+
+    def _boundary(self):
+        for anchor in self._open:
+            if anchor:
+                anchor[1].append("\0")
+
+    def start(self, tag, attrib):
+        self._boundary()
+        if tag == "a":
+            self._open.append([attrib["href"], []] if "href" in attrib else None)
+
+    def end(self, tag):
+        self._boundary()
+        if tag == "a" and self._open:
+            anchor = self._open.pop()
+            if anchor and len(self.links) < self.limit:
+                text = "".join(part.strip() for part in "".join(anchor[1]).split("\0"))
+                self.links.append((anchor[0], text))
+
+    def data(self, data):
+        for anchor in self._open:
+            if anchor:
+                anchor[1].append(data)
+
+    def close(self):
+        return self.links
+
+
+class LinkScanner:
+    """اسکن تکه‌ای لینک‌ها هم‌زمان با رسیدن body؛ feed با رسیدن به limit لینک True می‌دهد"""
+
+    def __init__(self, limit=SCRAPE_LINK_LIMIT):
+        self.limit = limit
+        self.failed = False
+        self._collector = _LinkCollector(limit)
+        self._parser = lxml_etree.HTMLParser(target=self._collector)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    @property
+    def done(self):
+        return len(self._collector.links) >= self.limit
+
+    def feed(self, chunk):
+        if self.failed or self.done:
+            return self.done
+        try:
+            self._parser.feed(self._decoder.decode(chunk))
+        except (UnicodeDecodeError, lxml_etree.LxmlError):
+            self.failed = True  # صفحه غیر UTF-8 یا markup عجیب: BeautifulSoup encoding را تشخیص می‌دهد
+        return self.done
+
+    def close(self):
+        """لینک‌های پیداشده، یا None اگر اسکن شکست خورد"""
+        if not self.failed and not self.done:
+            try:
+                self._parser.close()
+            except lxml_etree.LxmlError:
+                self.failed = True
+        return None if self.failed else self._collector.links
+
+
+def extract_links(content, limit=SCRAPE_LINK_LIMIT):
+    """(href, متن) اولین limit لینک صفحه؛ اسکن تکه‌ای با lxml و توقف زودهنگام"""
+    if lxml_etree is not None:
+        scanner = LinkScanner(limit)
+        for start in range(0, len(content), LINK_SCAN_CHUNK):
+            if scanner.feed(content[start:start + LINK_SCAN_CHUNK]) or scanner.failed:
+                break
+        links = scanner.close()
+        if links is not None:
+            return links
+
+    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer("a", href=True))
+    return [(link.get("href", ""), link.get_text(strip=True)) for link in soup.find_all("a", limit=limit)]
+
+
+# ============ SCRAPE RULES ============
+# قاعده خام (از get_scrape_rules) -> قاعده compile‌شده؛ کلید شامل محتوای قاعده است
+# تا تغییر قاعده خودبه‌خود compile دوباره بخواهد
+_rule_cache = {}
+
+
+def _compile_selector(expr):
+    """XPath یا (با پیشوند css:) CSS به یک XPath compile‌شده"""
+    if expr.startswith("css:"):
+        try:
+            from cssselect import GenericTranslator
+        except ImportError:
+            raise ValueError("برای selector های CSS پکیج cssselect لازم است")
+        expr = GenericTranslator().css_to_xpath(expr[len("css:"):])
+    return lxml_etree.XPath(expr)
+
+
+def compile_scrape_rule(domain, rule):
+    """compile قاعده یک دامنه (یا None اگر نامعتبر است یا lxml نصب نیست)"""
+    key = (domain, json.dumps(rule, sort_keys=True))
+    if key in _rule_cache:
+        return _rule_cache[key]
+
+    compiled = None
+    if lxml_etree is not None:
+        try:
+            compiled = {
+                "item": _compile_selector(rule["item"]) if rule.get("item") else None,
+                "link": _compile_selector(rule.get("link") or ".//a[@href]"),
+                "link_pattern": re.compile(rule["link_pattern"]) if rule.get("link_pattern") else None,
+                "title": _compile_selector(rule["title"]) if rule.get("title") else None,
+                "date": _compile_selector(rule["date"]) if rule.get("date") else None,
+            }
+        except (lxml_etree.XPathError, re.error, ValueError) as e:
+            logger.error(f"❌ قاعده استخراج نامعتبر برای {domain}: {e}")
+
+    _rule_cache[key] = compiled
+    return compiled
+
+
+def compile_scrape_rules():
+    """compile همه قواعد ذخیره‌شده (در شروع هر چرخه؛ قواعد تکراری از cache می‌آیند)"""
+    return {domain: compile_scrape_rule(domain, rule) for domain, rule in get_scrape_rules().items()}
+
+
+def _rule_for(url):
+    domain = (urlparse(url).hostname or "").removeprefix("www.")
+    rule = get_scrape_rules().get(domain)
+    return compile_scrape_rule(domain, rule) if rule else None
+
+
+def _xpath_text(result):
+    """اولین نتیجه XPath به متن (attribute/text یا متن element)"""
+    for value in result if isinstance(result, list) else [result]:
+        text = value.text_content() if isinstance(value, lxml_etree._Element) else str(value)
+        if text.strip():
+            return text
+    return ""
+
+
+def _rule_links(content, rule, limit=SCRAPE_LINK_LIMIT):
+    """(href, تیتر, تاریخ خام) با قاعده اختصاصی دامنه"""
+    tree = lxml_html.fromstring(content)
+    items = rule["item"](tree) if rule["item"] is not None else [tree]
+    links = []
+    for item in items:
+        if not isinstance(item, lxml_etree._Element):
+            continue
+        for anchor in rule["link"](item):
+            href = anchor.get("href") if isinstance(anchor, lxml_etree._Element) else str(anchor)
+            if not href or (rule["link_pattern"] and not rule["link_pattern"].search(href)):
                 continue
-            
-            title = entry.get("title", "بدون عنوان")
-            summary = entry.get("summary", "") or entry.get("description", "")
-            
-            # پاک‌سازی HTML از summary
-            if summary:
-                soup = BeautifulSoup(summary, "html.parser")
-                summary = soup.get_text().strip()[:400]
-            
-            articles.append({
-                "title": title,
-                "link": link,
-                "summary": summary,
-                "source": url,
-                "published": pub_date.isoformat(),
-            })
-            
-            # 🔧 FIX: حذف mark_sent از اینجا
-            # mark_sent باید فقط بعد از ارسال موفق صدا زده شود
-        
-        logger.info(f"✅ RSS: {len(articles)} خبر جدید از {url[:30]}")
+            title = _xpath_text(rule["title"](item)) if rule["title"] else anchor.text_content()
+            date = _xpath_text(rule["date"](item)) if rule["date"] else None
+            links.append((href, title.strip(), date))
+            if len(links) >= limit:
+                return links
+            if rule["item"] is not None:
+                break  # هر بلوک تیتر یک لینک
+    return links
+
+
+def _parse_published(value):
+    """تاریخ ISO یا RFC 2822 به datetime بدون timezone (یا None)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        published = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            published = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if published.tzinfo is not None:
+        published = published.astimezone().replace(tzinfo=None)
+    return published
+
+
+def _scraped_articles(url, content, scanned=None):
+    """استخراج لینک‌های خبری از HTML صفحه؛ scanned لینک‌هایی است که حین دریافت اسکن شده‌اند"""
+    articles = []
+
+    links = None
+    rule = _rule_for(url)
+    if rule:
+        try:
+            links = _rule_links(content, rule)
+        except Exception as e:
+            logger.error(f"❌ خطا در قاعده استخراج {url[:50]}: {e}")
+        if not links:
+            logger.info(f"ℹ️ قاعده استخراج نتیجه‌ای نداشت، روش عمومی: {url[:50]}")
+
+    # استراتژی عمومی: پیدا کردن لینک‌های خبری
+    generic = not links
+    if generic:
+        if scanned is None:
+            scanned = extract_links(content)  # محدود به 30 لینک
+        links = [(href, title, None) for href, title in scanned]
+
+    candidates = []
+    for href, title, date in links:
+
+        # اگر لینک نسبی است، کامل کنید
+        if href.startswith("/"):
+            href = urljoin(url, href)
+
+        # چک کردن که لینک معتبر باشه
+        if href.startswith("http"):
+            candidates.append((canonicalize_url(href), title, date))
+
+    # 🔧 FIX: فقط چک کردن، بدون mark کردن
+    sent_links = is_sent_many(href for href, _, _ in candidates)
+
+    seen_in_this_page = set()
+
+    for href, title, date in candidates:
+        # جلوگیری از تکرار در همین صفحه
+        if href in seen_in_this_page:
+            continue
+
+        if href in sent_links:
+            continue
+
+        # فقط لینک‌های مرتبط با خبر (قاعده اختصاصی خودش لینک را هدف گرفته)
+        keywords = ["news", "article", "cinema", "film", "movie", "entertainment", "/20"]
+        if generic and not any(keyword in href.lower() for keyword in keywords):
+            continue
+
+        if len(title) < 15:  # عنوان خیلی کوتاه
+            continue
+
+        # حذف کاراکترهای اضافی
+        title = " ".join(title.split())
+
+        articles.append({
+            "title": title,
+            "link": href,
+            "summary": "",
+            "source": url,
+            "published": (_parse_published(date) or datetime.now()).isoformat(),
+        })
+
+        seen_in_this_page.add(href)
+        # 🔧 FIX: حذف mark_sent از اینجا
+
+        # محدودیت تعداد اخبار از هر صفحه
+        if len(articles) >= 10:
+            break
+
+    logger.info(f"✅ Scrape: {len(articles)} خبر جدید از {url[:30]}")
+    return articles
+
+
+# ============ RETRY / HEDGE ============
+def _is_retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, httpx.UnsupportedProtocol):
+        return False
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def _retry_delay(attempt, error):
+    """مکث قبل از تلاش بعدی (backoff نمایی با jitter کامل)، یا None اگر نباید تکرار شود"""
+    # در پخش آرشیو پاسخ نیامده با تکرار هم نمی‌آید
+    retries = 0 if fetch_archive.MODE == "replay" else int(get_setting("fetch_max_retries", DEFAULT_MAX_RETRIES))
+    if attempt >= retries or not _is_retryable(error):
+        return None
+
+    base = float(get_setting("retry_backoff_seconds", DEFAULT_RETRY_BACKOFF))
+    cap = float(get_setting("retry_backoff_max_seconds", DEFAULT_RETRY_MAX_BACKOFF))
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if isinstance(error, httpx.HTTPStatusError):
+        # Retry-After (فقط فرم ثانیه‌ای) تا سقف backoff رعایت می‌شود
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), cap))
+    return delay
+
+
+def _hedge_delay(url):
+    """p95 latency موفق منبع (ثانیه) برای فرستادن درخواست دوم، یا None"""
+    if fetch_archive.MODE == "replay" or not get_setting("hedge_requests", True):
+        return None
+    samples = sorted(get_fetch_state("source_health").get(url, {}).get("latencies", []))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] / 1000
+    return max(p95, HEDGE_MIN_DELAY)
+
+
+# ============ BOUNDED BODY ============
+def get_source_max_bytes(url, kind):
+    """سقف حجم body یک منبع (بایت، بعد از decompress)؛ تنظیم اختصاصی source_max_bytes اولویت دارد"""
+    per_source = get_setting("source_max_bytes", {}) or {}
+    if url in per_source:
+        return int(per_source[url])
+    return int(get_setting(f"{kind}_max_bytes", DEFAULT_MAX_BYTES[kind]))
+
+
+class _BoundedBody:
+    """جمع کردن تکه‌های body تا سقف max_bytes
+
+    add با رسیدن به سقف (یا وقتی اسکنر لینک‌هایش را پیدا کرد) True می‌دهد تا خواندن
+    متوقف شود؛ بیشتر از max_bytes هیچ‌وقت در حافظه نگه داشته نمی‌شود.
+    """
+
+    def __init__(self, max_bytes, scanner=None):
+        self.max_bytes = max_bytes
+        self.scanner = scanner
+        self.size = 0
+        self.truncated = False
+        self._chunks = []
+
+    def add(self, chunk):
+        room = self.max_bytes - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        if self.scanner is not None and self.scanner.feed(chunk):
+            return True
+        return self.truncated
+
+    @property
+    def content(self):
+        return b"".join(self._chunks)
+
+
+def _body_for(url, kind):
+    """body محدود منبع؛ صفحه Scraping بدون قاعده اختصاصی حین دریافت اسکن می‌شود"""
+    scanner = None
+    if kind == "scrape" and lxml_etree is not None and _rule_for(url) is None:
+        scanner = LinkScanner()
+    return _BoundedBody(get_source_max_bytes(url, kind), scanner)
+
+
+def _parse_body(url, kind, body):
+    if kind == "rss":
+        return _parse_rss_content(url, body.content)
+    scanned = body.scanner.close() if body.scanner is not None else None
+    return _scraped_articles(url, body.content, scanned)
+
+
+def _log_oversize(url, label, body):
+    logger.warning(
+        f"📦 {label} بزرگ‌تر از سقف {body.max_bytes:,} بایت بود؛ "
+        f"فقط ابتدای آن parse شد: {url[:50]}"
+    )
+
+
+def _download_sync(url, kind):
+    body = _body_for(url, kind)
+    with get_http_client().stream("GET", url, timeout=get_source_timeout(url, kind)) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            if body.add(chunk):
+                break
+    return body
+
+
+def _fetch_source_sync(url, kind):
+    """دریافت همگام یک منبع با circuit breaker، سقف حجم و ثبت سلامت"""
+    label = "RSS" if kind == "rss" else "Scraping"
+    if not source_allowed(url):
+        logger.info(f"⏭️  {label} رد شد (مدار باز): {url[:50]}")
+        return []
+
+    started = time.perf_counter()
+    try:
+        logger.info(f"{'📰' if kind == 'rss' else '🕷️ '} در حال خواندن {label}: {url[:50]}...")
+        attempt = 0
+        while True:
+            try:
+                body = _download_sync(url, kind)
+                break
+            except Exception as e:
+                delay = _retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.info(f"🔁 تلاش دوباره {attempt} برای {label} {url[:50]} بعد از {delay:.1f}s: {e}")
+                time.sleep(delay)
+        if body.truncated:
+            _log_oversize(url, label, body)
+        articles = _parse_body(url, kind, body)
+        record_source_result(url, True, time.perf_counter() - started)
         return articles
-        
+
+    except httpx.TimeoutException:
+        logger.error(f"⏱️  Timeout در {label} {url[:50]}")
+        error = f"timeout {get_source_timeout(url, kind):g}s"
+    except httpx.HTTPError as e:
+        logger.error(f"❌ خطای شبکه در {label} {url[:50]}: {e}")
+        error = e
     except Exception as e:
-        logger.error(f"❌ خطا در RSS {url[:50]}: {e}")
-        return []
+        logger.error(f"❌ خطای غیرمنتظره در {label} {url[:50]}: {e}")
+        error = e
+    record_source_result(url, False, time.perf_counter() - started, error)
+    return []
+
+
+def fetch_rss_feed(url):
+    """دریافت اخبار از یک فید RSS"""
+    return _fetch_source_sync(url, "rss")
 
 
 def fetch_scraped_page(url):
     """دریافت اخبار با scraping مستقیم از صفحه"""
+    return _fetch_source_sync(url, "scrape")
+
+
+# ============ ASYNC ENGINE ============
+class HostRateLimiter:
+    """token bucket و سقف درخواست همزمان جدا برای هر host
+
+    چند منبع روی یک host (مثلاً دو فید variety.com یا RSS و صفحه
+    hollywoodreporter) پشت سر هم و با فاصله ارسال می‌شوند، اما hostهای
+    مختلف منتظر هم نمی‌مانند. نمونه برای هر چرخه ساخته می‌شود چون
+    primitive های asyncio به event loop وابسته‌اند.
+    """
+
+    def __init__(self, rate, burst, max_in_flight):
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self.max_in_flight = max(max_in_flight, 1)
+        self._buckets = {}      # host -> [tokens, last_refill]
+        self._locks = {}
+        self._in_flight = {}
+        self.waited = {}        # host -> ثانیه انتظار برای token
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            float(get_setting("host_rate_per_second", DEFAULT_HOST_RATE)),
+            int(get_setting("host_burst", DEFAULT_HOST_BURST)),
+            int(get_setting("host_max_in_flight", DEFAULT_HOST_MAX_IN_FLIGHT)),
+        )
+
+    async def _take_token(self, host):
+        bucket = self._buckets.setdefault(host, [float(self.burst), time.monotonic()])
+        # قفل در طول انتظار نگه داشته می‌شود تا منتظرها به ترتیب نوبت بگیرند
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            now = time.monotonic()
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                wait = (1 - bucket[0]) / self.rate
+                self.waited[host] = self.waited.get(host, 0) + wait
+                await asyncio.sleep(wait)
+                bucket[0], bucket[1] = 1.0, time.monotonic()
+            bucket[0] -= 1
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlparse(url).hostname or ""
+        semaphore = self._in_flight.setdefault(host, asyncio.Semaphore(self.max_in_flight))
+        async with semaphore:
+            await self._take_token(host)
+            yield
+
+    def busy(self, url):
+        """آیا سقف درخواست همزمان host پر است؟"""
+        semaphore = self._in_flight.get(urlparse(url).hostname or "")
+        return semaphore is not None and semaphore.locked()
+
+
+def get_source_timeout(url, kind):
+    """timeout کل یک منبع (ثانیه)؛ تنظیم اختصاصی source_timeouts اولویت دارد"""
+    per_source = get_setting("source_timeouts", {}) or {}
+    if url in per_source:
+        return float(per_source[url])
+    return float(get_setting(f"{kind}_timeout_seconds", DEFAULT_TIMEOUTS[kind]))
+
+
+def _parse_rss_content(url, content):
+    # bytes خام پاسخ مستقیم به feedparser داده می‌شود (بدون دانلود دوباره)
+    return _rss_articles(url, feedparser.parse(content))
+
+
+def _conditional_headers(url):
+    """هدرهای If-None-Match / If-Modified-Since از آخرین پاسخ ذخیره‌شده"""
+    # خبرِ در انتظار ارسال مجدد باید دوباره parse شود؛ 304 آن را پنهان می‌کند
+    retry = get_fetch_state("send_retry")
+    if any(entry.get("source") == url for entry in retry.values()):
+        return {}
+    cached = get_fetch_state("http_cache").get(url, {})
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+
+def _record_response(url, response, size, report, update_state=True):
+    """ثبت validatorها و آمار 304 برای منبع؛ size حجم body خوانده‌شده است"""
+    not_modified = response.status_code == 304
+    if not update_state:
+        report["requests"] += 1
+        report["bytes_downloaded"] += size
+        return
+
+    def apply(entry):
+        entry["requests"] = entry.get("requests", 0) + 1
+        if not_modified:
+            entry["not_modified"] = entry.get("not_modified", 0) + 1
+            entry["bytes_saved"] = entry.get("bytes_saved", 0) + entry.get("size", 0)
+            return entry.get("size", 0)
+        entry["etag"] = response.headers.get("ETag")
+        entry["last_modified"] = response.headers.get("Last-Modified")
+        entry["size"] = size
+        return 0
+
+    saved = update_fetch_state("http_cache", url, apply)
+    report["requests"] += 1
+    if not_modified:
+        report["not_modified"] += 1
+        report["bytes_saved"] += saved
+    else:
+        report["bytes_downloaded"] += size
+
+
+async def _download(client, url, body, headers, timeout):
+    """GET جریانی؛ body تکه‌تکه و حداکثر تا سقفش خوانده می‌شود"""
+    # timeout اتصال/خواندن همان timeout منبع است (نه پیش‌فرض 5 ثانیه httpx)؛
+    # wait_for بیرونی سقف کل درخواست است
+    async with client.stream("GET", url, headers=headers, timeout=httpx.Timeout(timeout)) as response:
+        if response.status_code != 304:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if body.add(chunk):
+                    break  # بقیه body دانلود نمی‌شود؛ اتصال بسته می‌شود
+    return response
+
+
+async def _attempt(client, semaphore, limiter, url, kind, timeout, headers, holding=None):
+    """یک درخواست کامل؛ (response, body, latency). holding با گرفتن نوبت set می‌شود"""
+    # اول نوبت host، بعد سهمیه سراسری؛ host شلوغ جای بقیه را نمی‌گیرد
+    async with limiter.slot(url), semaphore:
+        if holding is not None:
+            holding.set()
+        started = time.perf_counter()
+        body = _body_for(url, kind)
+        response = await asyncio.wait_for(_download(client, url, body, headers, timeout), timeout)
+        return response, body, time.perf_counter() - started
+
+
+async def _hedged_attempt(client, semaphore, limiter, url, kind, timeout, headers, hedge_after, report):
+    """اگر تا hedge_after (p95 منبع) جوابی نیامد درخواست دوم هم فرستاده می‌شود؛ اولین جواب موفق برنده است"""
+    if hedge_after is None:
+        return await _attempt(client, semaphore, limiter, url, kind, timeout, headers)
+
+    holding = asyncio.Event()
+    first = asyncio.create_task(
+        _attempt(client, semaphore, limiter, url, kind, timeout, headers, holding)
+    )
+    tasks = {first}
     try:
-        logger.info(f"🕷️  در حال Scraping: {url[:50]}...")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, "html.parser")
-        articles = []
-        
-        # استراتژی عمومی: پیدا کردن لینک‌های خبری
-        links = soup.find_all("a", href=True)
-        
-        seen_in_this_page = set()
-        
-        for link in links[:30]:  # محدود به 30 لینک
-            href = link.get("href", "")
-            
-            # اگر لینک نسبی است، کامل کنید
-            if href.startswith("/"):
-                from urllib.parse import urljoin
-                href = urljoin(url, href)
-            
-            # چک کردن که لینک معتبر باشه
-            if not href.startswith("http"):
-                continue
-            
-            # جلوگیری از تکرار در همین صفحه
-            if href in seen_in_this_page:
-                continue
-            
-            # 🔧 FIX: فقط چک کردن، بدون mark کردن
-            if is_sent(href):
-                continue
-            
-            # فقط لینک‌های مرتبط با خبر
-            keywords = ["news", "article", "cinema", "film", "movie", "entertainment", "/20"]
-            if not any(keyword in href.lower() for keyword in keywords):
-                continue
-            
-            title = link.get_text(strip=True)
-            if len(title) < 15:  # عنوان خیلی کوتاه
-                continue
-            
-            # حذف کاراکترهای اضافی
-            title = " ".join(title.split())
-            
-            articles.append({
-                "title": title,
-                "link": href,
-                "summary": "",
-                "source": url,
-                "published": datetime.now().isoformat(),
-            })
-            
-            seen_in_this_page.add(href)
-            # 🔧 FIX: حذف mark_sent از اینجا
-            
-            # محدودیت تعداد اخبار از هر صفحه
-            if len(articles) >= 10:
+        # زمان hedge از وقتی شمرده می‌شود که درخواست اول نوبت host و سهمیه سراسری را
+        # گرفته؛ منبعی که فقط در صف است hedge نمی‌شود
+        waiter = asyncio.create_task(holding.wait())
+        try:
+            await asyncio.wait({first, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+
+        if not done and (semaphore.locked() or limiter.busy(url)):
+            # درخواست دوم سهمیه‌ای را که منبع دیگری منتظرش است نمی‌گیرد
+            logger.debug(f"🪃 hedge رد شد (سهمیه پر): {url[:50]}")
+        elif not done:
+            logger.info(f"🪃 جوابی تا p95 ({hedge_after:.1f}s) نیامد، درخواست دوم: {url[:50]}")
+            report["hedged"] += 1
+            # درخواست دوم هم از محدودکننده host رد می‌شود
+            tasks.add(asyncio.create_task(_attempt(client, semaphore, limiter, url, kind, timeout, headers)))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    response, body, latency = task.result()
+                    if task is not first:
+                        report["hedge_wins"] += 1
+                        latency += hedge_after  # زمانی که واقعاً منتظر ماندیم، نه فقط درخواست دوم
+                    return response, body, latency
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def fetch_source_async(client, semaphore, limiter, url, kind, report, update_state=True):
+    """دریافت و parse یک منبع؛ خطاها لاگ و در سلامت منبع ثبت می‌شوند و لیست خالی برمی‌گردد
+
+    با update_state=False (مثلاً تست ادمین) GET شرطی فرستاده و validatorها ذخیره نمی‌شوند.
+    """
+    label = "RSS" if kind == "rss" else "Scraping"
+    if not source_allowed(url):
+        logger.info(f"⏭️  {label} رد شد (مدار باز): {url[:50]}")
+        report["skipped"].append(url)
+        return []
+
+    timeout = get_source_timeout(url, kind)
+    hedge_after = _hedge_delay(url)
+    # آرشیو باید body کامل داشته باشد؛ 304 ضبط‌شده در پخش هیچ خبری نمی‌دهد
+    conditional = update_state and not fetch_archive.enabled()
+    headers = _conditional_headers(url) if conditional else {}
+    started = time.perf_counter()
+    try:
+        logger.info(f"{'📰' if kind == 'rss' else '🕷️ '} در حال خواندن {label}: {url[:50]}...")
+        attempt = 0
+        while True:
+            try:
+                response, body, latency = await _hedged_attempt(
+                    client, semaphore, limiter, url, kind, timeout, headers, hedge_after, report
+                )
                 break
-        
-        logger.info(f"✅ Scrape: {len(articles)} خبر جدید از {url[:30]}")
+            except Exception as e:
+                delay = _retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                attempt += 1
+                report["retries"] += 1
+                logger.info(f"🔁 تلاش دوباره {attempt} برای {label} {url[:50]} بعد از {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+        if response.status_code == 304:
+            _record_response(url, response, body.size, report, update_state)
+            record_source_result(url, True, latency)
+            logger.info(f"♻️ {label} بدون تغییر (304): {url[:50]}")
+            return []
+
+        if body.truncated:
+            _log_oversize(url, label, body)
+            report["oversize"].append(url)
+        # parse در thread جدا تا event loop بلاک نشود
+        articles = await asyncio.to_thread(_parse_body, url, kind, body)
+        # validatorها فقط بعد از parse موفق؛ اگر parse خطا بدهد یا بودجه چرخه آن را
+        # لغو کند، دریافت بعدی به‌جای 304 دوباره body کامل می‌گیرد
+        _record_response(url, response, body.size, report, update_state)
+        record_source_result(url, True, latency)
         return articles
-        
-    except requests.exceptions.Timeout:
-        logger.error(f"⏱️  Timeout در Scraping {url[:50]}")
-        return []
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ خطای شبکه در Scraping {url[:50]}: {e}")
-        return []
+
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        logger.error(f"⏱️  Timeout در {label} {url[:50]} ({timeout:g}s)")
+        error = f"timeout {timeout:g}s"
+    except httpx.HTTPError as e:
+        logger.error(f"❌ خطای شبکه در {label} {url[:50]}: {e}")
+        error = e
     except Exception as e:
-        logger.error(f"❌ خطای غیرمنتظره در Scraping {url[:50]}: {e}")
-        return []
+        logger.error(f"❌ خطای غیرمنتظره در {label} {url[:50]}: {e}")
+        error = e
+    record_source_result(url, False, time.perf_counter() - started, error)
+    return []
 
 
-def fetch_all_news():
-    """جمع‌آوری تمام اخبار از همه منابع"""
+def log_conditional_get_report(report, urls):
+    """لاگ صرفه‌جویی GET شرطی در این چرخه و نسبت 304 هر منبع"""
+    logger.info(
+        f"♻️ GET شرطی: {report['not_modified']}/{report['requests']} پاسخ 304، "
+        f"{report['bytes_saved'] / 1024:.0f} KB صرفه‌جویی، "
+        f"{report['bytes_downloaded'] / 1024:.0f} KB دانلود"
+    )
+    http_cache = get_fetch_state("http_cache")
+    for url in urls:
+        entry = http_cache.get(url)
+        if entry and entry.get("requests"):
+            ratio = entry.get("not_modified", 0) / entry["requests"]
+            logger.info(f"   {ratio:.0%} 304 ({entry['requests']} درخواست): {url[:50]}")
+
+
+async def fetch_all_news_async(rss_sources=None, scrape_sources=None, update_state=True):
+    """جمع‌آوری همزمان اخبار؛ بدون آرگومان از همه منابع، وگرنه فقط منابع داده‌شده
+
+    update_state=False برای دریافت‌هایی که نتیجه‌شان ارسال نمی‌شود (دکمه تست ادمین):
+    ETag/Last-Modified منابع دست نمی‌خورد تا scheduler به‌خاطر آن پاسخ 304 نگیرد.
+    """
     logger.info("\n" + "="*60)
     logger.info("🔄 شروع جمع‌آوری اخبار از تمام منابع...")
     logger.info("="*60)
-    
-    all_articles = []
-    
-    # دریافت از RSS
-    rss_sources = get_rss_sources()
+
+    if rss_sources is None:
+        rss_sources = get_rss_sources()
+    if scrape_sources is None:
+        scrape_sources = get_scrape_sources()
     logger.info(f"📰 تعداد منابع RSS: {len(rss_sources)}")
-    for rss_url in rss_sources:
-        try:
-            articles = fetch_rss_feed(rss_url)
-            if articles:  # فقط اگر خبر جدید داشت
-                all_articles.extend(articles)
-        except Exception as e:
-            logger.error(f"❌ خطا در پردازش RSS {rss_url[:30]}: {e}")
-            continue
-    
-    # دریافت از Scraping
-    scrape_sources = get_scrape_sources()
     logger.info(f"🕷️  تعداد منابع Scraping: {len(scrape_sources)}")
-    for scrape_url in scrape_sources:
-        try:
-            articles = fetch_scraped_page(scrape_url)
-            if articles:  # فقط اگر خبر جدید داشت
-                all_articles.extend(articles)
-        except Exception as e:
-            logger.error(f"❌ خطا در پردازش Scraping {scrape_url[:30]}: {e}")
-            continue
-    
+
+    compile_scrape_rules()
+    fetch_archive.start_cycle(rss_sources, scrape_sources)
+
+    max_concurrency = int(get_setting("fetch_max_concurrency", DEFAULT_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    started = datetime.now()
+
+    limiter = HostRateLimiter.from_settings()
+    report = {
+        "requests": 0, "not_modified": 0, "bytes_saved": 0, "bytes_downloaded": 0,
+        "skipped": [], "oversize": [], "retries": 0, "hedged": 0, "hedge_wins": 0,
+    }
+
+    client = get_async_client()
+    sources = [(url, "rss") for url in rss_sources] + [(url, "scrape") for url in scrape_sources]
+    tasks = [
+        asyncio.create_task(fetch_source_async(client, semaphore, limiter, url, kind, report, update_state))
+        for url, kind in sources
+    ]
+
+    # بعد از بودجه چرخه، منابع باقی‌مانده لغو می‌شوند تا رتبه‌بندی و ارسال سر وقت شروع شود
+    budget = float(get_setting("fetch_cycle_budget_seconds", DEFAULT_CYCLE_BUDGET))
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    timed_out = [url for (url, _), task in zip(sources, tasks) if task in pending]
+
+    all_articles = [
+        article
+        for task in tasks if task not in pending
+        for article in task.result()
+    ]
+    log_conditional_get_report(report, rss_sources + scrape_sources)
+    if report["skipped"]:
+        logger.info(f"🔌 {len(report['skipped'])} منبع به‌خاطر مدار باز رد شد")
+    if report["retries"] or report["hedged"]:
+        logger.info(
+            f"🔁 {report['retries']} تلاش دوباره، {report['hedged']} درخواست hedge "
+            f"({report['hedge_wins']} بار درخواست دوم زودتر رسید)"
+        )
+    if report["oversize"]:
+        logger.warning(f"📦 {len(report['oversize'])} پاسخ بزرگ‌تر از سقف حجم بود و ناقص parse شد")
+    if timed_out:
+        logger.warning(f"⏰ بودجه چرخه ({budget:g}s) تمام شد؛ {len(timed_out)} منبع لغو شد:")
+        for url in timed_out:
+            logger.warning(f"   ⏭️  {url[:60]}")
+    for host, waited in sorted(limiter.waited.items()):
+        logger.info(f"🐢 {host}: {waited:.1f}s انتظار برای محدودیت نرخ")
+
+    elapsed = (datetime.now() - started).total_seconds()
+    set_setting("last_fetch_cycle", {
+        "time": started.isoformat(),
+        "elapsed": round(elapsed, 2),
+        "budget": budget,
+        "sources": len(sources),
+        "timed_out": timed_out,
+        "circuit_open": report["skipped"],
+        "oversize": report["oversize"],
+        "retries": report["retries"],
+        "hedged": report["hedged"],
+    })
     logger.info("="*60)
-    logger.info(f"✅ جمعاً {len(all_articles)} خبر جدید جمع‌آوری شد")
+    logger.info(f"✅ جمعاً {len(all_articles)} خبر جدید جمع‌آوری شد ({elapsed:.1f}s)")
     logger.info("="*60 + "\n")
-    
+
     return all_articles
 
 
+def fetch_all_news():
+    """جمع‌آوری تمام اخبار از همه منابع (نسخه همگام برای اجرای بیرون از event loop)"""
+    async def run():
+        try:
+            return await fetch_all_news_async()
+        finally:
+            # loop موقت asyncio.run بعد از این بسته می‌شود
+            await close_async_client()
+
+    return asyncio.run(run())
+
+
 if __name__ == "__main__":
     # تست
     print("🧪 تست ماژول news_fetcher...\n")
-    
+
     # نمایش تعداد منابع
     rss = get_rss_sources()
     scrape = get_scrape_sources()
     print(f"📰 منابع RSS: {len(rss)}")
     print(f"🕷️ منابع Scraping: {len(scrape)}\n")
-    
+
     # جمع‌آوری اخبار
     news = fetch_all_news()
     print(f"\n📊 تعداد اخبار جمع‌آوری شده: {len(news)}")
-    
+
     if news:
         print(f"📰 اولین خبر: {news[0]['title'][:60]}...")
         print(f"🔗 لینک: {news[0]['link'][:60]}...")
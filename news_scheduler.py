@@ -3,10 +3,12 @@ Scheduler بدون باگ با:
 1. mark_sent فقط بعد از ارسال موفق
 2. ذخیره اخبار در فایل روزانه
 3. جلوگیری از تکرار کامل
+4. زمان‌بندی تطبیقی هر منبع بر اساس نرخ انتشار خبر جدید
 """
 
 import asyncio
 import os
+import time
 from datetime import datetime, time as dtime, timedelta
 import pytz
 import logging
@@ -14,14 +16,16 @@ import logging
 from telegram import Bot
 from telegram.error import TelegramError, RetryAfter
 
-from news_fetcher import fetch_all_news
+from news_fetcher import fetch_all_news_async, close_async_client
 from news_ranker import rank_news
 from translation import translate_title
 from category import classify_category
 from database import (
     get_setting, set_setting, 
-    save_collected_news, mark_sent, 
-    save_topic
+    save_collected_news, mark_sent_many,
+    save_topics_many, get_cache_stats, compact_topics,
+    cleanup_old_sent, get_rss_sources, get_scrape_sources,
+    get_fetch_state, update_fetch_state, remove_fetch_state
 )
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
@@ -44,20 +48,235 @@ def get_fetch_interval():
     return int(get_setting("news_fetch_interval_hours", 3))
 
 
+def get_poll_bounds():
+    """حداقل و حداکثر فاصله poll هر منبع (ساعت)"""
+    min_hours = float(get_setting("poll_min_interval_minutes", 30)) / 60
+    max_hours = float(get_setting("poll_max_interval_hours", 12))
+    return min_hours, max(min_hours, max_hours)
+
+
+def get_maintenance_interval():
+    return float(get_setting("maintenance_interval_hours", 6))
+
+
 def get_trend_time():
     hour = int(get_setting("trend_hour", 23))
     minute = int(get_setting("trend_minute", 55))
     return dtime(hour, minute)
 
 
-async def fetch_and_send_news():
-    """جمع‌آوری و ارسال اخبار با ذخیره صحیح"""
+# ============ ADAPTIVE POLLING ============
+# وضعیت هر منبع در fetch_state("poll_state"):
+#   {url: {"rate": خبر جدید در ساعت (EWMA), "last_poll": ts, "next_poll": ts, "seen": [...]}}
+# فاصله هر منبع = base * mean_rate / rate_i، محدود به [min, max]. مجموع 1/interval
+# (قبل از clamp) همان N/base است، پس حجم کل درخواست‌ها بالا نمی‌رود.
+SEEN_LINKS_PER_SOURCE = 30
+
+
+def record_source_polls(urls, articles, now=None):
+    """ثبت نتیجه poll منابع و به‌روزرسانی نرخ خبر جدید هر کدام"""
+    now = now or time.time()
+    alpha = float(get_setting("poll_rate_alpha", 0.3))
+
+    links_by_source = {}
+    for article in articles:
+        links_by_source.setdefault(article.get("source"), []).append(article.get("link"))
+
+    for url in urls:
+        links = links_by_source.get(url, [])
+
+        def apply(entry, links=links):
+            # لینک‌هایی که poll قبلی هم دیده بود (ارسال‌نشده) جدید حساب نمی‌شوند
+            seen = set(entry.get("seen", []))
+            new_items = sum(1 for link in links if link not in seen)
+            if entry.get("last_poll"):
+                hours = max((now - entry["last_poll"]) / 3600, 1 / 60)
+                observed = new_items / hours
+                rate = entry.get("rate")
+                entry["rate"] = observed if rate is None else alpha * observed + (1 - alpha) * rate
+            entry["last_poll"] = now
+            entry["seen"] = links[-SEEN_LINKS_PER_SOURCE:]
+
+        update_fetch_state("poll_state", url, apply)
+
+    plan_next_polls()
+
+
+def plan_next_polls():
+    """محاسبه زمان poll بعدی همه منابع بر اساس نرخ نسبی آن‌ها"""
+    base = get_fetch_interval()
+    min_hours, max_hours = get_poll_bounds()
+    state = get_fetch_state("poll_state")
+
+    rates = [entry["rate"] for entry in state.values() if entry.get("rate") is not None]
+    mean_rate = sum(rates) / len(rates) if rates else 0
+
+    for url, entry in state.items():
+        if not entry.get("last_poll"):
+            continue
+        rate = entry.get("rate")
+        if rate is None or mean_rate <= 0:
+            interval = base
+        else:
+            interval = base * mean_rate / max(rate, mean_rate / 100)
+        interval = min(max(interval, min_hours), max_hours)
+        next_poll = entry["last_poll"] + interval * 3600
+
+        def apply(entry, next_poll=next_poll):
+            entry["next_poll"] = next_poll
+
+        update_fetch_state("poll_state", url, apply)
+
+
+def get_due_sources(now=None):
+    """منابعی که نوبت poll آن‌ها رسیده (منبع بدون سابقه همیشه due است)"""
+    now = now or time.time()
+    state = get_fetch_state("poll_state")
+
+    def due(url):
+        return state.get(url, {}).get("next_poll", 0) <= now
+
+    return (
+        [url for url in get_rss_sources() if due(url)],
+        [url for url in get_scrape_sources() if due(url)],
+    )
+
+
+def seconds_until_next_poll(now=None):
+    """فاصله تا نزدیک‌ترین poll (حداقل 60 ثانیه)؛ منبعی که هنوز زمان‌بندی نشده همین حالا due است"""
+    now = now or time.time()
+    state = get_fetch_state("poll_state")
+    next_polls = [
+        state.get(url, {}).get("next_poll") or now
+        for url in get_rss_sources() + get_scrape_sources()
+    ]
+    if not next_polls:
+        return get_fetch_interval() * 3600
+    return max(60, min(next_polls) - now)
+
+
+def log_cache_stats(before):
+    """لاگ آمار کش database در این چرخه"""
+    after = get_cache_stats()
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    writes = after["writes"] - before["writes"]
+    mutations = after["mutations"] - before["mutations"]
+    logger.info(
+        f"💾 کش: {hits} hit / {misses} خواندن فایل / "
+        f"{mutations} تغییر در {writes} نوشتن"
+    )
+
+
+def record_sent_items(sent_items, today):
+    """ثبت دسته‌ای اخبار ارسال‌شده در sent و topics"""
+    if not sent_items:
+        return
+    mark_sent_many([item['link'] for item in sent_items])
+    save_topics_many([
+        {
+            "topic": item['title'],
+            "link": item['link'],
+            "source": item.get('source', 'unknown'),
+            "date": today,
+        }
+        for item in sent_items
+    ])
+
+
+# خبرهای رتبه‌بندی‌شده‌ای که ارسالشان شکست خورد در fetch_state("send_retry") می‌مانند:
+#   {link: {"source": url, "since": ts}}
+# تا RSS آن‌ها را زیر مرز آخرین خبر ارسال‌شده هم برگرداند (news_fetcher._unseen_entries).
+SEND_RETRY_MAX_AGE = 7 * 24 * 3600
+
+
+def record_send_retries(ranked, sent_items, now=None):
+    """ثبت خبرهای ارسال‌نشده برای چرخه بعد و حذف ارسال‌شده‌ها و قدیمی‌ها"""
+    now = now or time.time()
+    sent_links = {item['link'] for item in sent_items}
+    pending = get_fetch_state("send_retry")
+    for item in ranked:
+        if item['link'] not in sent_links and item['link'] not in pending:
+            update_fetch_state(
+                "send_retry", item['link'],
+                lambda entry, source=item.get('source'): entry.update(source=source, since=now),
+            )
+    expired = [
+        link for link, entry in pending.items()
+        if now - entry.get("since", now) > SEND_RETRY_MAX_AGE
+    ]
+    remove_fetch_state("send_retry", [link for link in sent_links if link in pending] + expired)
+
+
+async def send_news_item(chat_id, item, sent_items):
+    """ارسال یک خبر؛ در صورت موفقیت به sent_items اضافه می‌شود"""
+    # ترجمه
+    title_fa = translate_title(item['title'])
+    summary = item.get('summary', '')
+    summary_fa = translate_title(summary[:300]) if summary else ""
+
+    # دسته‌بندی
+    category = classify_category(item['title'], summary)
+    category_tag = category.split()[1] if ' ' in category else category
+    category_tag = f"#{category_tag}"
+
+    # ایموجی
+    importance = item.get('importance', 1)
+    emoji_map = {3: "🔥🔥🔥", 2: "⭐⭐", 1: "⭐", 0: "•"}
+    importance_emoji = emoji_map.get(importance, "⭐")
+
+    # پیام
+    msg = (
+        f"{category} {category_tag}\n\n"
+        f"*{title_fa}*\n\n"
+        f"{summary_fa}\n\n"
+        f"🔗 [خبر اصلی]({item['link']})\n"
+        f"{importance_emoji} اهمیت: {importance}/3"
+    )
+
+    try:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=msg,
+            parse_mode="Markdown",
+            disable_web_page_preview=False,
+        )
+
+        # ✅ فقط الان mark کن
+        sent_items.append(item)
+
+        logger.info(f"✅ ارسال: {title_fa[:40]}...")
+        await asyncio.sleep(3)
+
+    except RetryAfter as e:
+        logger.warning(f"⏱️ Flood: صبر {e.retry_after}s")
+        await asyncio.sleep(e.retry_after + 1)
+
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=msg,
+                parse_mode="Markdown",
+                disable_web_page_preview=False,
+            )
+            sent_items.append(item)
+            logger.info(f"✅ ارسال (تلاش 2): {title_fa[:40]}...")
+        except Exception as e2:
+            logger.error(f"❌ تلاش دوم: {e2}")
+
+    except TelegramError as e:
+        logger.error(f"❌ خطای تلگرام: {e}")
+
+
+async def fetch_and_send_news(rss_sources=None, scrape_sources=None):
+    """جمع‌آوری و ارسال اخبار با ذخیره صحیح (پیش‌فرض: همه منابع)"""
     logger.info("\n" + "="*60)
     logger.info("⏰ شروع جمع‌آوری اخبار")
     logger.info(f"🕐 {now_tehran().strftime('%Y-%m-%d %H:%M:%S')} تهران")
     logger.info("="*60)
     
     start_time = now_tehran()
+    cache_before = get_cache_stats()
     set_setting("last_news_fetch", start_time.isoformat())
     
     TARGET_CHAT_ID = get_setting("TARGET_CHAT_ID")
@@ -77,7 +296,17 @@ async def fetch_and_send_news():
     min_importance = int(get_setting("min_importance", "1"))
     
     # جمع‌آوری
-    all_news = fetch_all_news()
+    polled = None
+    if rss_sources is not None or scrape_sources is not None:
+        rss_sources, scrape_sources = rss_sources or [], scrape_sources or []
+        polled = rss_sources + scrape_sources
+        logger.info(f"🎯 {len(polled)} منبع در نوبت poll")
+    all_news = await fetch_all_news_async(rss_sources, scrape_sources)
+    if polled is not None:
+        # منابعی که با تمام شدن بودجه چرخه لغو شدند poll نشده‌اند و due می‌مانند
+        cycle = get_setting("last_fetch_cycle") or {}
+        timed_out = set(cycle.get("timed_out", []))
+        record_source_polls([url for url in polled if url not in timed_out], all_news)
     
     if not all_news:
         logger.info("📭 خبر جدیدی نیست")
@@ -94,90 +323,25 @@ async def fetch_and_send_news():
     
     # ذخیره در collected_news
     save_collected_news(ranked)
-    logger.info(f"💾 {len(ranked)} خبر در collected_news.json ذخیره شد")
+    logger.info(f"💾 {len(ranked)} خبر در collected_news ذخیره شد")
     
     logger.info(f"📨 ارسال {len(ranked)} خبر به {TARGET_CHAT_ID}...")
     
-    sent_count = 0
+    sent_items = []
     today = now_tehran().date().isoformat()
     
-    for item in ranked:
-        # ترجمه
-        title_fa = translate_title(item['title'])
-        summary = item.get('summary', '')
-        summary_fa = translate_title(summary[:300]) if summary else ""
-        
-        # دسته‌بندی
-        category = classify_category(item['title'], summary)
-        category_tag = category.split()[1] if ' ' in category else category
-        category_tag = f"#{category_tag}"
-        
-        # ایموجی
-        importance = item.get('importance', 1)
-        emoji_map = {3: "🔥🔥🔥", 2: "⭐⭐", 1: "⭐", 0: "•"}
-        importance_emoji = emoji_map.get(importance, "⭐")
-        
-        # پیام
-        msg = (
-            f"{category} {category_tag}\n\n"
-            f"*{title_fa}*\n\n"
-            f"{summary_fa}\n\n"
-            f"🔗 [خبر اصلی]({item['link']})\n"
-            f"{importance_emoji} اهمیت: {importance}/3"
-        )
-        
-        try:
-            await bot.send_message(
-                chat_id=TARGET_CHAT_ID,
-                text=msg,
-                parse_mode="Markdown",
-                disable_web_page_preview=False,
-            )
-            
-            sent_count += 1
-            
-            # ✅ فقط الان mark کن
-            mark_sent(item['link'])
-            
-            # ذخیره برای ترند
-            save_topic(
-                topic=item['title'],
-                link=item['link'],
-                source=item.get('source', 'unknown'),
-                date=today
-            )
-            
-            logger.info(f"✅ ارسال: {title_fa[:40]}...")
-            await asyncio.sleep(3)
-            
-        except RetryAfter as e:
-            logger.warning(f"⏱️ Flood: صبر {e.retry_after}s")
-            await asyncio.sleep(e.retry_after + 1)
-            
-            try:
-                await bot.send_message(
-                    chat_id=TARGET_CHAT_ID,
-                    text=msg,
-                    parse_mode="Markdown",
-                    disable_web_page_preview=False,
-                )
-                sent_count += 1
-                mark_sent(item['link'])
-                save_topic(
-                    topic=item['title'],
-                    link=item['link'],
-                    source=item.get('source', 'unknown'),
-                    date=today
-                )
-                logger.info(f"✅ ارسال (تلاش 2): {title_fa[:40]}...")
-            except Exception as e2:
-                logger.error(f"❌ تلاش دوم: {e2}")
-                
-        except TelegramError as e:
-            logger.error(f"❌ خطای تلگرام: {e}")
+    try:
+        for item in ranked:
+            await send_news_item(TARGET_CHAT_ID, item, sent_items)
+    finally:
+        # یک بار نوشتن برای کل چرخه (حتی اگر چرخه نیمه‌کاره قطع شود)
+        record_sent_items(sent_items, today)
+        record_send_retries(ranked, sent_items)
     
+    sent_count = len(sent_items)
     logger.info(f"✅ {sent_count} خبر ارسال شد")
     set_setting("last_news_send", now_tehran().isoformat())
+    log_cache_stats(cache_before)
     logger.info("="*60 + "\n")
 
 
@@ -274,18 +438,48 @@ async def schedule_daily_trend():
 
 
 async def schedule_news_fetching():
-    """زمان‌بندی دریافت اخبار"""
+    """زمان‌بندی دریافت اخبار؛ هر بار فقط منابعی که نوبتشان رسیده"""
     while True:
-        await fetch_and_send_news()
+        rss_due, scrape_due = get_due_sources()
+        if rss_due or scrape_due:
+            await fetch_and_send_news(rss_due, scrape_due)
         
-        interval = get_fetch_interval()
-        next_fetch = now_tehran() + timedelta(hours=interval)
+        wait_seconds = seconds_until_next_poll()
+        next_fetch = now_tehran() + timedelta(seconds=wait_seconds)
         set_setting("next_news_fetch", next_fetch.isoformat())
         
-        logger.info(f"😴 خواب {interval} ساعت")
+        logger.info(f"😴 خواب {wait_seconds / 3600:.2f} ساعت")
         logger.info(f"📅 بعدی: {next_fetch.strftime('%Y-%m-%d %H:%M')} تهران\n")
         
-        await asyncio.sleep(interval * 3600)
+        await asyncio.sleep(wait_seconds)
+
+
+def run_maintenance():
+    """نگهداری دوره‌ای ذخیره‌سازی (در thread جدا اجرا می‌شود)"""
+    eviction = cleanup_old_sent()
+    eviction["time"] = now_tehran().isoformat()
+    set_setting("last_sent_cleanup", eviction)
+    logger.info(
+        f"🧹 پاکسازی sent: {eviction['evicted']} لینک منقضی حذف شد، "
+        f"{eviction['remaining']} باقی ماند ({eviction['duration']:.3f}s)"
+    )
+
+    result = compact_topics()
+    logger.info(
+        f"🧹 فشرده‌سازی topics: {result['removed_files']} فایل قدیمی و "
+        f"{result['removed_lines']} خط تکراری حذف شد"
+    )
+
+
+async def schedule_maintenance():
+    """زمان‌بندی نگهداری در پس‌زمینه، بدون بلاک کردن چرخه خبر"""
+    while True:
+        try:
+            await asyncio.to_thread(run_maintenance)
+        except Exception as e:
+            logger.error(f"❌ خطا در نگهداری: {e}")
+
+        await asyncio.sleep(get_maintenance_interval() * 3600)
 
 
 async def run_scheduler():
@@ -304,10 +498,14 @@ async def run_scheduler():
     logger.info("🛑 توقف: CTRL+C")
     logger.info("="*60 + "\n")
     
-    await asyncio.gather(
-        schedule_news_fetching(),
-        schedule_daily_trend(),
-    )
+    try:
+        await asyncio.gather(
+            schedule_news_fetching(),
+            schedule_daily_trend(),
+            schedule_maintenance(),
+        )
+    finally:
+        await close_async_client()
 
 
 def start_scheduler():
@@ -0,0 +1,624 @@
+"""
+بک‌اند SQLite برای database.py
+همان توابع database.py را با همان امضا پیاده‌سازی می‌کند
+
+فعال‌سازی:
+    DB_BACKEND=sqlite
+    DB_PATH=data/bot.db   (اختیاری)
+
+انتقال داده‌های قبلی JSON:
+    python sqlite_backend.py
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from link_identity import LINK_KEY_LENGTH, as_link_key, is_link_key, link_key
+
+DB_PATH = os.getenv("DB_PATH", "data/bot.db")
+
+# توابعی که در database.py با نسخه SQLite جایگزین می‌شوند
+API = [
+    "get_setting", "set_setting",
+    "get_sources", "get_rss_sources", "get_scrape_sources",
+    "add_rss_source", "add_scrape_source",
+    "remove_rss_source", "remove_scrape_source",
+    "get_scrape_rules", "set_scrape_rule", "remove_scrape_rule",
+    "is_sent", "is_sent_many", "mark_sent", "mark_sent_many", "cleanup_old_sent",
+    "save_topic", "save_topics_many", "compact_topics", "daily_trends",
+    "save_collected_news", "get_collected_news", "get_all_collected_news",
+    "query_collected_news",
+    "get_fetch_state", "update_fetch_state", "remove_fetch_state",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    UNIQUE (kind, url)
+);
+CREATE TABLE IF NOT EXISTS scrape_rules (
+    domain TEXT PRIMARY KEY,
+    rule TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fetch_state (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS sent (
+    uid TEXT PRIMARY KEY,
+    sent_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    link TEXT,
+    source TEXT,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_topics_date ON topics (date);
+CREATE TABLE IF NOT EXISTS collected_news (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    link TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (date, link)
+);
+CREATE INDEX IF NOT EXISTS idx_collected_news_date ON collected_news (date);
+CREATE INDEX IF NOT EXISTS idx_collected_news_link ON collected_news (link);
+CREATE INDEX IF NOT EXISTS idx_collected_news_source
+    ON collected_news (json_extract(data, '$.source'));
+CREATE INDEX IF NOT EXISTS idx_collected_news_importance
+    ON collected_news (json_extract(data, '$.importance'));
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """اتصال جدا برای هر thread (sqlite3 اتصال مشترک بین threadها را نمی‌پذیرد)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+        _hash_legacy_sent(conn)
+    return conn
+
+
+_legacy_sent_checked = False
+
+
+def _hash_legacy_sent(conn):
+    """تبدیل یک‌باره uidهای قدیمی (URL خام) جدول sent به link_key"""
+    global _legacy_sent_checked
+    if _legacy_sent_checked:
+        return
+    _legacy_sent_checked = True
+
+    rows = conn.execute(
+        "SELECT uid, sent_at FROM sent WHERE length(uid) != ?", (LINK_KEY_LENGTH,)
+    ).fetchall()
+    rows = [(uid, sent_at) for uid, sent_at in rows if not is_link_key(uid)]
+    if not rows:
+        return
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO sent (uid, sent_at) VALUES (?, ?)",
+            [(link_key(uid), sent_at) for uid, sent_at in rows],
+        )
+        conn.executemany("DELETE FROM sent WHERE uid = ?", [(uid,) for uid, _ in rows])
+    print(f"🔑 {len(rows)} لینک قدیمی sent به link_key تبدیل شد")
+
+
+# ============ SETTINGS ============
+def get_setting(key, default=None):
+    """دریافت یک تنظیم"""
+    row = _connect().execute(
+        "SELECT value FROM settings WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return default
+    return json.loads(row[0])
+
+
+def set_setting(key, value):
+    """ذخیره یک تنظیم"""
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+
+# ============ SOURCES ============
+def _get_kind(kind):
+    rows = _connect().execute(
+        "SELECT url FROM sources WHERE kind = ? ORDER BY id", (kind,)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _add_kind(kind, url):
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO sources (kind, url) VALUES (?, ?)", (kind, url)
+        )
+
+
+def _remove_kind(kind, url):
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM sources WHERE kind = ? AND url = ?", (kind, url))
+
+
+def get_sources():
+    """برگرداندن همه منابع"""
+    return {"rss": _get_kind("rss"), "scrape": _get_kind("scrape")}
+
+
+def get_rss_sources():
+    """دریافت منابع RSS"""
+    return _get_kind("rss")
+
+
+def get_scrape_sources():
+    """دریافت منابع Scrape"""
+    return _get_kind("scrape")
+
+
+def add_rss_source(url):
+    """افزودن منبع RSS"""
+    _add_kind("rss", url)
+
+
+def add_scrape_source(url):
+    """افزودن منبع Scrape"""
+    _add_kind("scrape", url)
+
+
+def remove_rss_source(url):
+    """حذف منبع RSS"""
+    _remove_kind("rss", url)
+
+
+def remove_scrape_source(url):
+    """حذف منبع Scrape"""
+    _remove_kind("scrape", url)
+
+
+def get_scrape_rules():
+    """دریافت قواعد استخراج Scraping به شکل {domain: rule}"""
+    rows = _connect().execute("SELECT domain, rule FROM scrape_rules").fetchall()
+    return {domain: json.loads(rule) for domain, rule in rows}
+
+
+def set_scrape_rule(domain, rule):
+    """افزودن/جایگزینی قاعده استخراج یک دامنه"""
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO scrape_rules (domain, rule) VALUES (?, ?)",
+            (domain, json.dumps(rule, ensure_ascii=False)),
+        )
+
+
+def remove_scrape_rule(domain):
+    """حذف قاعده استخراج یک دامنه"""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM scrape_rules WHERE domain = ?", (domain,))
+
+
+# ============ FETCH STATE ============
+def get_fetch_state(name):
+    """خواندن سند وضعیت دریافت منابع"""
+    rows = _connect().execute(
+        "SELECT key, data FROM fetch_state WHERE name = ?", (name,)
+    ).fetchall()
+    return {key: json.loads(data) for key, data in rows}
+
+
+def update_fetch_state(name, key, apply):
+    """اعمال apply روی ورودی key از سند name در یک تراکنش"""
+    conn = _connect()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT data FROM fetch_state WHERE name = ? AND key = ?", (name, key)
+        ).fetchone()
+        entry = json.loads(row[0]) if row else {}
+        result = apply(entry)
+        conn.execute(
+            "INSERT OR REPLACE INTO fetch_state (name, key, data) VALUES (?, ?, ?)",
+            (name, key, json.dumps(entry, ensure_ascii=False)),
+        )
+    return result
+
+
+def remove_fetch_state(name, keys):
+    """حذف ورودی‌های keys از سند name"""
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "DELETE FROM fetch_state WHERE name = ? AND key = ?",
+            [(name, key) for key in keys],
+        )
+
+
+# ============ SENT ============
+def is_sent(uid):
+    """چک کردن ارسال شده بودن (بر اساس link_key)"""
+    row = _connect().execute(
+        "SELECT 1 FROM sent WHERE uid = ?", (as_link_key(uid),)
+    ).fetchone()
+    return row is not None
+
+
+def is_sent_many(uids):
+    """چک کردن دسته‌ای؛ مجموعه uidهایی که قبلاً ارسال شده‌اند"""
+    by_key = {}
+    for uid in uids:
+        by_key.setdefault(as_link_key(uid), []).append(uid)
+    keys = list(by_key)
+    conn = _connect()
+    found = set()
+    # محدودیت تعداد پارامترهای SQLite
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT uid FROM sent WHERE uid IN ({placeholders})", chunk
+        ).fetchall()
+        for (key,) in rows:
+            found.update(by_key[key])
+    return found
+
+
+def mark_sent(uid):
+    """علامت‌گذاری به عنوان ارسال شده"""
+    mark_sent_many([uid])
+
+
+def mark_sent_many(uids):
+    """علامت‌گذاری دسته‌ای در یک تراکنش"""
+    now = datetime.now().isoformat()
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO sent (uid, sent_at) VALUES (?, ?)",
+            [(as_link_key(uid), now) for uid in uids],
+        )
+
+
+def cleanup_old_sent(days=None):
+    """حذف لینک‌های قدیمی‌تر از days روز (TTL)"""
+    started = time.perf_counter()
+    if days is None:
+        days = float(get_setting("sent_ttl_days", 30))
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+
+    conn = _connect()
+    with conn:
+        cursor = conn.execute("DELETE FROM sent WHERE sent_at < ?", (cutoff,))
+    remaining = conn.execute("SELECT COUNT(*) FROM sent").fetchone()[0]
+
+    return {
+        "evicted": cursor.rowcount,
+        "remaining": remaining,
+        "duration": round(time.perf_counter() - started, 4),
+    }
+
+
+# ============ TOPICS ============
+def save_topic(topic, link, source, date):
+    """ذخیره topic برای تحلیل ترند"""
+    save_topics_many([{"topic": topic, "link": link, "source": source, "date": date}])
+
+
+def save_topics_many(topics):
+    """ذخیره دسته‌ای topicها در یک تراکنش"""
+    now = datetime.now().isoformat()
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO topics (topic, link, source, date, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (item.get("topic") or "", item.get("link"), item.get("source"),
+                 item.get("date"), now)
+                for item in topics
+            ],
+        )
+
+
+def compact_topics(retention_days=None):
+    """حذف topicهای قدیمی‌تر از retention"""
+    if retention_days is None:
+        retention_days = int(get_setting("topic_retention_days", 30))
+    cutoff = (datetime.utcnow().date() - timedelta(days=retention_days)).isoformat()
+
+    conn = _connect()
+    with conn:
+        cursor = conn.execute("DELETE FROM topics WHERE date < ?", (cutoff,))
+    return {"removed_files": 0, "removed_lines": cursor.rowcount}
+
+
+def daily_trends(date=None):
+    """دریافت ترندهای یک روز خاص"""
+    if date is None:
+        date = datetime.utcnow().date().isoformat()
+
+    rows = _connect().execute(
+        "SELECT topic, COALESCE(source, 'unknown'), COALESCE(link, '') "
+        "FROM topics WHERE date = ? AND topic != '' ORDER BY id",
+        (date,),
+    ).fetchall()
+
+    count = {}
+    for topic, source, link in rows:
+        if topic not in count:
+            count[topic] = {"sources": set(), "links": []}
+        count[topic]["sources"].add(source)
+        count[topic]["links"].append(link)
+
+    # ترندها: موضوعاتی که از 2 منبع یا بیشتر آمده‌اند
+    trends = []
+    for topic, info in count.items():
+        if len(info["sources"]) >= 2:
+            trends.append({
+                "topic": topic,
+                "source_count": len(info["sources"]),
+                "sources": list(info["sources"]),
+                "links": info["links"][:3]
+            })
+
+    trends.sort(key=lambda x: x["source_count"], reverse=True)
+    return trends
+
+
+# ============ COLLECTED NEWS ============
+def save_collected_news(news_list):
+    """ذخیره اخبار جمع‌آوری شده روزانه"""
+    today = datetime.utcnow().date().isoformat()
+    cutoff_date = (datetime.utcnow().date() - timedelta(days=7)).isoformat()
+
+    rows = [
+        (today, news["link"], json.dumps(news, ensure_ascii=False))
+        for news in news_list
+        if news.get("link")
+    ]
+
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO collected_news (date, link, data) VALUES (?, ?, ?)",
+            rows,
+        )
+        # حذف اخبار قدیمی‌تر از 7 روز
+        conn.execute("DELETE FROM collected_news WHERE date < ?", (cutoff_date,))
+
+
+def get_collected_news(limit=None, date=None):
+    """خواندن اخبار جمع‌آوری شده"""
+    if date is None:
+        date = datetime.utcnow().date().isoformat()
+
+    query = "SELECT data FROM collected_news WHERE date = ? ORDER BY id"
+    params = [date]
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    rows = _connect().execute(query, params).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def get_all_collected_news(days=7):
+    """دریافت تمام اخبار چند روز اخیر؛ جدیدترین روز اول و به‌صورت lazy"""
+    dates = [
+        r[0] for r in _connect().execute(
+            "SELECT DISTINCT date FROM collected_news ORDER BY date DESC LIMIT ?",
+            (days,),
+        )
+    ]
+
+    for date in dates:
+        yield from get_collected_news(date=date)
+
+
+def query_collected_news(date=None, link=None, source=None, importance=None, days=7):
+    """جستجوی اخبار جمع‌آوری شده با ایندکس‌ها"""
+    conditions = []
+    params = []
+    if date:
+        conditions.append("date = ?")
+        params.append(date)
+    else:
+        cutoff = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+        conditions.append("date >= ?")
+        params.append(cutoff)
+    if link is not None:
+        conditions.append("link = ?")
+        params.append(link)
+    if source is not None:
+        conditions.append("json_extract(data, '$.source') = ?")
+        params.append(source)
+    if importance is not None:
+        conditions.append("json_extract(data, '$.importance') = ?")
+        params.append(importance)
+
+    rows = _connect().execute(
+        f"SELECT data FROM collected_news WHERE {' AND '.join(conditions)} "
+        "ORDER BY date DESC, id",
+        params,
+    ).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+# ============ MIGRATION ============
+def _read_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            content = f.read().strip()
+        return json.loads(content) if content else default
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        print(f"⚠️ خطا در خواندن {path}: {e}")
+        return default
+
+
+def migrate_from_json(base="data"):
+    """انتقال یک‌باره فایل‌های JSON موجود به SQLite (تکرار آن بی‌خطر است)"""
+    conn = _connect()
+    counts = {}
+
+    settings = _read_json(f"{base}/settings.json", {})
+    sources = _read_json(f"{base}/sources.json", {})
+    now = datetime.now().isoformat()
+
+    sent = [
+        (as_link_key(uid), now)
+        for uid in _read_json(f"{base}/sent.json", []) if isinstance(uid, str)
+    ]
+    if os.path.exists(f"{base}/sent.log"):
+        # خطوط "timestamp<TAB>uid" (و خطوط قدیمی بدون زمان)
+        sent = []
+        with open(f"{base}/sent.log", encoding="utf-8") as f:
+            for line in f:
+                ts, sep, uid = line.rstrip("\n").partition("\t")
+                if not sep:
+                    ts, uid = None, ts
+                if not uid:
+                    continue
+                try:
+                    sent_at = datetime.fromtimestamp(float(ts)).isoformat()
+                except (TypeError, ValueError):
+                    sent_at = now
+                sent.append((as_link_key(uid), sent_at))
+
+    # topics.json قدیمی و فایل‌های روزانه data/topics/*.jsonl
+    topics = _read_json(f"{base}/topics.json", [])
+    if not isinstance(topics, list):
+        topics = []
+    topics_dir = f"{base}/topics"
+    if os.path.isdir(topics_dir):
+        for name in sorted(os.listdir(topics_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            with open(os.path.join(topics_dir, name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        topics.append(json.loads(line))
+                    except ValueError:
+                        continue
+
+    # collected_news.json قدیمی و فایل‌های روزانه data/collected_news/*.json
+    collected = _read_json(f"{base}/collected_news.json", {})
+    if not isinstance(collected, dict):
+        collected = {}
+    collected_dir = f"{base}/collected_news"
+    if os.path.isdir(collected_dir):
+        for name in sorted(os.listdir(collected_dir)):
+            if name.endswith(".json"):
+                collected[name[:-len(".json")]] = _read_json(
+                    os.path.join(collected_dir, name), []
+                )
+
+    with conn:
+        if isinstance(settings, dict):
+            conn.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in settings.items()],
+            )
+            counts["settings"] = len(settings)
+
+        if isinstance(sources, dict):
+            rows = [
+                (kind, url)
+                for kind in ("rss", "scrape")
+                for url in sources.get(kind, [])
+            ]
+            conn.executemany(
+                "INSERT OR IGNORE INTO sources (kind, url) VALUES (?, ?)", rows
+            )
+            counts["sources"] = len(rows)
+
+            rules = sources.get("rules", {})
+            if isinstance(rules, dict):
+                conn.executemany(
+                    "INSERT OR IGNORE INTO scrape_rules (domain, rule) VALUES (?, ?)",
+                    [(d, json.dumps(r, ensure_ascii=False)) for d, r in rules.items()],
+                )
+                counts["scrape_rules"] = len(rules)
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO sent (uid, sent_at) VALUES (?, ?)", sent
+        )
+        counts["sent"] = len(sent)
+
+        has_topics = conn.execute("SELECT 1 FROM topics LIMIT 1").fetchone()
+        if not has_topics:
+            rows = [
+                (
+                    item.get("topic") or "", item.get("link", ""),
+                    item.get("source", "unknown"), item.get("date", ""),
+                    item.get("timestamp", now),
+                )
+                for item in topics
+                if isinstance(item, dict) and item.get("date")
+            ]
+            conn.executemany(
+                "INSERT INTO topics (topic, link, source, date, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            counts["topics"] = len(rows)
+
+        if collected:
+            rows = [
+                (date, news["link"], json.dumps(news, ensure_ascii=False))
+                for date, news_list in collected.items()
+                if isinstance(news_list, list)
+                for news in news_list
+                if isinstance(news, dict) and news.get("link")
+            ]
+            conn.executemany(
+                "INSERT OR IGNORE INTO collected_news (date, link, data) VALUES (?, ?, ?)",
+                rows,
+            )
+            counts["collected_news"] = len(rows)
+
+    return counts
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print(f"📦 انتقال داده‌های JSON به {DB_PATH}")
+    print("="*60 + "\n")
+
+    for name, count in migrate_from_json().items():
+        print(f"✅ {name}: {count}")
+
+    print("\n💡 برای استفاده: DB_BACKEND=sqlite")
+    print("="*60 + "\n")
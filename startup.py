@@ -4,8 +4,11 @@ Initializes default sources if needed and runs the main bot
 """
 
 import os
-from database import get_rss_sources, get_scrape_sources, add_rss_source, add_scrape_source
-from default_sources import DEFAULT_RSS_SOURCES, DEFAULT_SCRAPE_SITES
+from database import (
+    get_rss_sources, get_scrape_sources, add_rss_source, add_scrape_source,
+    get_scrape_rules, set_scrape_rule,
+)
+from default_sources import DEFAULT_RSS_SOURCES, DEFAULT_SCRAPE_SITES, DEFAULT_SCRAPE_RULES
 
 def initialize_if_needed():
     """Add default sources if database is empty"""
@@ -51,6 +54,13 @@ def initialize_if_needed():
     else:
         print("\nSources already configured.")
     
+    # Add default extraction rules for domains that have none
+    current_rules = get_scrape_rules()
+    for domain, rule in DEFAULT_SCRAPE_RULES.items():
+        if domain not in current_rules:
+            set_scrape_rule(domain, rule)
+            print(f"   Added scrape rule: {domain}")
+    
     print("="*70 + "\n")
 
 
@@ -6,7 +6,7 @@
 from datetime import datetime, timedelta
 import jdatetime
 import pytz
-from database import get_setting, get_rss_sources, get_scrape_sources
+from database import get_setting, get_rss_sources, get_scrape_sources, get_fetch_state
 
 # Timezone تهران
 TEHRAN_TZ = pytz.timezone('Asia/Tehran')
@@ -106,6 +106,35 @@ def format_datetime_dual(dt_str):
         return dt.strftime('%Y-%m-%d')
 
 
+def format_source_health(sources, now):
+    """خلاصه سلامت منابع و فهرست منابع مشکل‌دار"""
+    health = get_fetch_state("source_health")
+    entries = [(url, health[url]) for url in sources if url in health]
+    open_count = sum(1 for _, e in entries if e.get("state") == "open")
+    half_open = sum(1 for _, e in entries if e.get("state") == "half_open")
+
+    msg = "🩺 *سلامت منابع:*\n"
+    msg += f"✅ سالم: {len(entries) - open_count - half_open}"
+    msg += f" | 🔌 باز: {open_count} | 🔄 نیمه‌باز: {half_open}\n"
+
+    problems = sorted(
+        (item for item in entries if item[1].get("consecutive_errors")),
+        key=lambda item: -item[1]["consecutive_errors"],
+    )
+    for url, entry in problems[:5]:
+        total = entry.get("success", 0) + entry.get("failure", 0)
+        line = (
+            f"⚠️ {url.split('//')[-1][:35]}: {entry['consecutive_errors']} خطای پیاپی، "
+            f"{entry.get('success', 0)}/{total} موفق، {entry.get('latency_ms', 0):.0f}ms"
+        )
+        if entry.get("state") == "open":
+            retry_at = datetime.fromtimestamp(entry.get("open_until", 0), TEHRAN_TZ)
+            line += f"، امتحان بعدی {format_timedelta(retry_at - now)} دیگر"
+        msg += line + "\n"
+
+    return msg + "\n"
+
+
 def get_status_message():
     """دریافت پیام کامل وضعیت ربات"""
 
@@ -122,6 +151,8 @@ def get_status_message():
     last_send = get_setting("last_news_send")
     next_fetch = get_setting("next_news_fetch")
     next_trend = get_setting("next_trend_time")
+    last_cleanup = get_setting("last_sent_cleanup")
+    last_cycle = get_setting("last_fetch_cycle")
 
     if next_fetch:
         next_dt = parse_datetime_with_tz(next_fetch)
@@ -154,13 +185,33 @@ def get_status_message():
 
     msg += "✅ *آخرین فعالیت‌ها:*\n"
     msg += f"🔄 آخرین جمع‌آوری: {format_datetime_persian(last_fetch)}\n"
-    msg += f"📤 آخرین ارسال: {format_datetime_persian(last_send)}\n\n"
+    msg += f"📤 آخرین ارسال: {format_datetime_persian(last_send)}\n"
+    if isinstance(last_cycle, dict):
+        msg += (
+            f"⏱️ آخرین چرخه دریافت: {last_cycle.get('elapsed', 0)}s از "
+            f"{last_cycle.get('budget', 0):g}s بودجه"
+        )
+        if last_cycle.get("timed_out"):
+            msg += f"، {len(last_cycle['timed_out'])} منبع جا ماند"
+        if last_cycle.get("oversize"):
+            msg += f"، {len(last_cycle['oversize'])} صفحه بزرگ‌تر از سقف"
+        msg += "\n"
+    if isinstance(last_cleanup, dict):
+        msg += (
+            f"🧹 آخرین پاکسازی: {format_datetime_persian(last_cleanup.get('time'))} "
+            f"({last_cleanup.get('evicted', 0)} حذف، "
+            f"{last_cleanup.get('remaining', 0)} باقی، "
+            f"{last_cleanup.get('duration', 0)}s)\n"
+        )
+    msg += "\n"
 
     msg += "📰 *منابع فعال:*\n"
     msg += f"📡 RSS: {rss_count} منبع\n"
     msg += f"🕷️ Scraping: {scrape_count} منبع\n"
     msg += f"📊 مجموع: {rss_count + scrape_count} منبع\n\n"
 
+    msg += format_source_health(get_rss_sources() + get_scrape_sources(), now)
+
     msg += "🎯 *تنظیمات:*\n"
     msg += f"📢 کانال مقصد: `{target_chat}`\n"
     msg += f"⭐ حداقل اهمیت: {min_importance}/3\n\n"
@@ -18,6 +18,39 @@ TOPICS_FILE = "data/topics.json"
 os.makedirs(DAILY_NEWS_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(TOPICS_FILE), exist_ok=True)
 
+# کش فایل روزانه امروز: مسیر -> ((mtime_ns, size), لیست اخبار، set(url))
+# فایل فقط وقتی دوباره خوانده می‌شود که mtime یا size آن تغییر کرده باشد
+_daily_cache = {}
+
+
+def _daily_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_daily_news(path):
+    """لیست اخبار فایل روزانه و مجموعه لینک‌های آن (از کش اگر فایل تغییر نکرده)"""
+    signature = _daily_signature(path)
+    cached = _daily_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+
+    news_list = []
+    if signature is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        # 🔧 FIX: بررسی نوع داده - اگر dict بود، از نو شروع کن
+        if isinstance(content, list):
+            news_list = content
+
+    urls = {n.get("url") for n in news_list}
+    _daily_cache.clear()  # فقط یک فایل (امروز) نگه داشته می‌شود
+    _daily_cache[path] = (signature, news_list, urls)
+    return news_list, urls
+
 
 def save_daily_news(news_item):
     """
@@ -27,21 +60,12 @@ def save_daily_news(news_item):
     today_file = os.path.join(DAILY_NEWS_DIR, f"{today}.json")
     
     try:
-        # خواندن فایل فعلی
-        if os.path.exists(today_file):
-            with open(today_file, "r", encoding="utf-8") as f:
-                content = json.load(f)
-                # 🔧 FIX: بررسی نوع داده
-                if isinstance(content, dict):
-                    news_list = []  # اگر dict بود، از نو شروع کن
-                else:
-                    news_list = content
-        else:
-            news_list = []
+        # خواندن فایل فعلی (از کش، مگر اینکه روی دیسک تغییر کرده باشد)
+        news_list, known_urls = _load_daily_news(today_file)
         
-        # 🔧 FIX: چک کردن تکراری نبودن
+        # 🔧 FIX: چک کردن تکراری نبودن (با ایندکس لینک‌ها)
         url = news_item.get("link", news_item.get("url", ""))
-        if url and any(n.get("url") == url for n in news_list):
+        if url and url in known_urls:
             logger.debug(f"⚠️ خبر تکراری: {url[:50]}...")
             return  # اگر تکراری بود، ذخیره نکن
         
@@ -57,10 +81,13 @@ def save_daily_news(news_item):
         # ذخیره
         with open(today_file, "w", encoding="utf-8") as f:
             json.dump(news_list, f, ensure_ascii=False, indent=2)
+        known_urls.add(url)
+        _daily_cache[today_file] = (_daily_signature(today_file), news_list, known_urls)
         
         logger.debug(f"✅ خبر در فایل روزانه ذخیره شد: {today_file}")
         
     except Exception as e:
+        _daily_cache.pop(today_file, None)  # نسخه حافظه ممکن است با دیسک فرق کند
         logger.error(f"❌ خطا در ذخیره خبر روزانه: {e}")
         import traceback
         logger.error(traceback.format_exc())
@@ -153,8 +180,7 @@ def find_daily_trends(min_sources=2):
         return []
     
     try:
-        with open(today_file, "r", encoding="utf-8") as f:
-            news_list = json.load(f)
+        news_list, _ = _load_daily_news(today_file)
         
         logger.info(f"✅ {len(news_list)} خبر از فایل روزانه خوانده شد")
         